@@ -15,8 +15,7 @@ st.markdown(
 
 # — Optionally re-scan for new query-expanders at runtime
 if st.sidebar.button("🔄 Refresh All Modules"):
-    SEARCH_SPACE.clear()
-    SEARCH_SPACE.update(reload_search_space())
+    reload_search_space()   # only imports new/changed expander files
     st.rerun()
 
 # Sidebar: pick a node
@@ -25,9 +24,8 @@ node = st.sidebar.radio("Choose a node", list(SEARCH_SPACE.keys()))
 
 # Main: list existing modules
 st.subheader(f"Candidates for **{node}**")
-for mod in SEARCH_SPACE[node]:
-    label = getattr(mod, "name", None) or mod.__class__.__name__
-    st.write(f"- **{label}**   (`{mod.__class__.__name__}`)")
+for factory in SEARCH_SPACE[node]:
+    st.write(f"- **{factory.name}**   (`{factory!r}`)")
 
 # If we're looking at query_expansion, show a form to add a new one
 if node == "query_expansion":
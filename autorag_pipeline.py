@@ -1,13 +1,18 @@
 import json
 import pathlib
-from typing import Optional, Dict, Any, List
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Sequence, Tuple
 
-from greedy_search import GreedyAutoRAG
+import pipeline_store
 from pdf_loader import PDFChunker
-from azure_index_loader import AzureIndexLoader
+from azure_index_loader import AzureIndexLoader, key_ranges
 from embedder import Embedder
+from executor import StageExecutor
 from qa_generator import QAGenerator
 from langchain.schema import Document
+from config import settings
 
 
 class AutoRAGPipeline:
@@ -15,6 +20,8 @@ class AutoRAGPipeline:
     Two separate flows:
       • build_index()  → chunk or load index + QA gen only
       • ask_via_pdf() / ask_via_index() → load GT + optimize + answer
+    The optimised pipeline is saved to settings.PIPELINE_ARTIFACT and reused
+    by later asks until ground truth, collection or search space change.
     """
 
     def __init__(self, pipeline):
@@ -28,14 +35,16 @@ class AutoRAGPipeline:
         2) generate QA ground truth and save ground_truth.json
         (no optimisation)
         """
-        gt_path = pathlib.Path("ground_truth.json")
-        if gt_path.exists() and not overwrite:
+        if cls._ground_truth_complete() and not overwrite:
             print(f"✅ ground_truth.json already exists (use --overwrite to rebuild).")
             return
         print("📄 Chunking PDF…")
-        chunks = PDFChunker(pdf_path).load_chunks()
+        chunker = PDFChunker(pdf_path)
+        chunks = chunker.load_chunks()
         print("🔌 Embedding chunks…")
-        Embedder().ingest(chunks)
+        embedder = Embedder()
+        with embedder.bulk_load():
+            embedder.ingest(chunks, pages=chunker.pages)
         print("✍️ Generating QA ground truth…")
         QAGenerator(qa_per_chunk=qa_per_chunk).build_ground_truth(chunks)
         print("✅ build complete.")
@@ -43,60 +52,155 @@ class AutoRAGPipeline:
     @classmethod
     def build_from_index(cls, index_name: str, qa_per_chunk: int = 2, overwrite: bool = False) -> None:
         """
-        1) load chunks from Azure Search
-        2) generate QA ground truth (same format)
+        1) stream chunks from Azure Search, embedding them in batches as they pass
+        2) generate QA ground truth (same format) from the same stream
         """
-        gt_path = pathlib.Path("ground_truth.json")
-        if gt_path.exists() and not overwrite:
+        if cls._ground_truth_complete() and not overwrite:
             print(f"✅ ground_truth.json already exists (use --overwrite to rebuild).")
             return
-        print(f"🔍 Loading chunks from index '{index_name}'…")
-        chunks = AzureIndexLoader(index_name).load_chunks()
+        print(f"🔍 Streaming chunks from index '{index_name}'…")
+        loader = AzureIndexLoader(index_name,
+                                  partitions=key_ranges(settings.AZURE_SEARCH_PARTITIONS),
+                                  max_workers=settings.AZURE_SEARCH_WORKERS)
+        chunks = cls._ingest_stream(loader.iter_chunks(), Embedder())
         print("✍️ Generating QA ground truth…")
         QAGenerator(qa_per_chunk=qa_per_chunk).build_ground_truth(chunks)
         print("✅ build complete.")
 
+    @staticmethod
+    def _ground_truth_complete(gt_path: str = "ground_truth.json") -> bool:
+        """
+        ground_truth.json exists and no chunk is left to retry: the QA
+        checkpoint next to it is only kept while some chunk failed, and a
+        build then resumes from it instead of returning early.
+        """
+        gt_path = pathlib.Path(gt_path)
+        return gt_path.exists() and not gt_path.with_suffix(".partial.jsonl").exists()
+
+    @staticmethod
+    def _ingest_stream(docs: Iterable[Document], embedder: Embedder,
+                       batch_size: int = 2000) -> Iterator[Document]:
+        """
+        Pass docs through unchanged, ingesting them in batches on the way.
+        The whole stream is one bulk load: the ANN index is dropped before the
+        first batch and rebuilt after the last.
+        """
+        with embedder.bulk_load():
+            batch: List[Document] = []
+            for d in docs:
+                batch.append(d)
+                yield d
+                if len(batch) >= batch_size:
+                    embedder.ingest(batch)
+                    batch = []
+            if batch:
+                embedder.ingest(batch)
+
     @classmethod
-    def ask_via_pdf(cls, pdf_path: str, qa_per_chunk: int = 2) -> "AutoRAGPipeline":
+    def ask_via_pdf(cls, pdf_path: str, qa_per_chunk: int = 2, reoptimise: bool = False) -> "AutoRAGPipeline":
         """
         1) ensure ground_truth.json exists (or build it)
-        2) optimize the pipeline
+        2) load the saved pipeline, or optimize it if missing/stale
         """
         if not pathlib.Path("ground_truth.json").exists():
             cls.build_from_pdf(pdf_path, qa_per_chunk=qa_per_chunk)
-        with open("ground_truth.json") as f:
-            gt = json.load(f)
-        print(f"🚀 Optimising pipeline on {len(gt)} GT entries…")
-        best_pipeline = GreedyAutoRAG(gt).optimise()
-        print("✅ optimisation done.")
-        return cls(best_pipeline)
+        return cls(cls._load_or_optimise(reoptimise))
 
     @classmethod
-    def ask_via_index(cls, index_name: str, qa_per_chunk: int = 2) -> "AutoRAGPipeline":
+    def ask_via_index(cls, index_name: str, qa_per_chunk: int = 2, reoptimise: bool = False) -> "AutoRAGPipeline":
         """
         1) ensure ground_truth.json exists (or build it via index)
-        2) optimize the pipeline
+        2) load the saved pipeline, or optimize it if missing/stale
         """
         if not pathlib.Path("ground_truth.json").exists():
             cls.build_from_index(index_name, qa_per_chunk=qa_per_chunk)
+        return cls(cls._load_or_optimise(reoptimise))
+
+    @staticmethod
+    def _load_or_optimise(reoptimise: bool = False) -> Dict[str, Any]:
+        fp = pipeline_store.fingerprint("ground_truth.json")
+        if not reoptimise:
+            best_pipeline = pipeline_store.load(fp)
+            if best_pipeline is not None:
+                print(f"⚡ Loaded optimised pipeline from {settings.PIPELINE_ARTIFACT}")
+                return best_pipeline
+
+        # imported here: the serving path above never needs the search space
+        from optimisers import make_optimiser
+
         with open("ground_truth.json") as f:
             gt = json.load(f)
         print(f"🚀 Optimising pipeline on {len(gt)} GT entries…")
-        best_pipeline = GreedyAutoRAG(gt).optimise()
+        search = make_optimiser(gt)
+        best_pipeline = search.optimise()
         print("✅ optimisation done.")
-        return cls(best_pipeline)
+        pipeline_store.save(best_pipeline, search.scores, fp)
+        return best_pipeline
 
     def __call__(self, question: str) -> Dict[str, Any]:
-        q2 = self.pipeline["query_expansion"](question)
-        docs = self.pipeline["retrieval"](q2, k=10)
-        texts = [d.page_content for d in docs]
-        docs2 = self.pipeline["augmentation"](docs)
-        docs3 = self.pipeline["reranker"](question, docs2, top_k=5)
-        prompt = self.pipeline["prompt_maker"](question, docs3)
-        answer, _ = self.pipeline["generator"](prompt, docs3)
+        return self.batch([question])[0]
+
+    def batch(self, questions: Sequence[str], batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Answer many questions stage by stage (see executor.py), `batch_size`
+        (settings.PIPELINE_BATCH_SIZE) at a time.  Same records as __call__,
+        in input order.
+        """
+        batch_size = batch_size or settings.PIPELINE_BATCH_SIZE
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(questions), batch_size):
+            chunk = list(questions[start:start + batch_size])
+            outs = StageExecutor(self.pipeline).run(chunk)
+            results.extend(self._record(q, out) for q, out in zip(chunk, outs))
+        return results
+
+    def stream(self,
+               questions: Iterable[str],
+               batch_size: Optional[int] = None,
+               concurrency: Optional[int] = None) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, float]]]:
+        """
+        Answer a (possibly long) stream of questions with up to `concurrency`
+        batches in flight.  Yields (records, timings) per batch as soon as it
+        completes, so batches arrive out of order; each record carries the
+        question's input position as "index".  `timings` is seconds per
+        stage for that batch, plus "total".
+        """
+        batch_size = batch_size or settings.PIPELINE_BATCH_SIZE
+        concurrency = max(1, concurrency or settings.ASK_CONCURRENCY)
+
+        def run(start: int, chunk: List[str]):
+            t0 = time.perf_counter()
+            executor = StageExecutor(self.pipeline)
+            outs = executor.run(chunk)
+            timings = {node: sum(secs) for node, secs in executor.timings.items()}
+            timings["total"] = time.perf_counter() - t0
+            records = [{"index": start + i, **self._record(q, out)}
+                       for i, (q, out) in enumerate(zip(chunk, outs))]
+            return records, timings
+
+        questions = iter(questions)
+        start = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            in_flight = set()
+            while True:
+                chunk = list(islice(questions, batch_size))
+                if chunk:
+                    in_flight.add(pool.submit(run, start, chunk))
+                    start += len(chunk)
+                # keep `concurrency` batches running; drain once the input is exhausted
+                if in_flight and (len(in_flight) >= concurrency or not chunk):
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        yield fut.result()
+                if not chunk and not in_flight:
+                    return
+
+    @staticmethod
+    def _record(question: str, out: Dict[str, Any]) -> Dict[str, Any]:
+        answer, _ = out["generator"]
         return {
             "question": question,
-            "prompt": prompt,
-            "retrieved_contexts": texts,
+            "prompt": out["prompt_maker"],
+            "retrieved_contexts": [d.page_content for d in out["retrieval"]],
             "answer": answer,
-        }
\ No newline at end of file
+        }
@@ -1,38 +1,165 @@
 # azure_index_loader.py
-from typing import List
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
 from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
 from azure.core.credentials import AzureKeyCredential
 from langchain.schema import Document
 
 from config import settings
 
+# (lower bound inclusive, upper bound exclusive) on the key field; None = open
+KeyRange = Tuple[Optional[str], Optional[str]]
+
+_DONE = object()
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def key_ranges(bounds: Sequence[str]) -> List[KeyRange]:
+    """Split the key space at `bounds`, e.g. ["8"] → [(None, "8"), ("8", None)]."""
+    edges: List[Optional[str]] = [None, *sorted(set(bounds)), None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
 class AzureIndexLoader:
     """
-    Pull every document (chunk) out of an Azure Cognitive Search index
-    and return it as a List[langchain.schema.Document].
+    Stream every document (chunk) out of an Azure Cognitive Search index
+    as langchain.schema.Document objects.
     Expects each record in the index to have:
-      - 'id'           → a unique chunk_id
+      - 'id'           → a unique chunk_id (filterable + sortable)
       - 'content'      → the chunk text
       - optionally 'page' → page number
+
+    Pages through the whole index with keyset pagination (`id gt <last>`
+    ordered by id), so there is no 1,000-doc or skip limit.  Pass
+    `partitions` (key ranges) to fetch them concurrently on `max_workers`
+    threads.  `client` can be any object with SearchClient's `search()`,
+    e.g. a local stub.
+
+    `fields` is sent as `select`.  By default it is the key field and
+    'content', plus 'page' when the index schema has one; with a custom
+    `client` the schema is not looked up and every field is returned.
     """
-    def __init__(self, index_name: str):
-        self.client = SearchClient(
+    def __init__(self,
+                 index_name: str,
+                 client: Any = None,
+                 page_size: int = 1000,
+                 partitions: Optional[Sequence[KeyRange]] = None,
+                 max_workers: int = 4,
+                 key_field: str = "id",
+                 fields: Optional[Sequence[str]] = None):
+        self.index_name = index_name
+        credential = AzureKeyCredential(settings.AZURE_SEARCH_KEY)
+        if fields is None and client is None:
+            fields = self._default_fields(index_name, key_field, credential)
+        self.client = client or SearchClient(
             endpoint=settings.AZURE_SEARCH_ENDPOINT,
             index_name=index_name,
-            credential=AzureKeyCredential(settings.AZURE_SEARCH_KEY),
+            credential=credential,
         )
+        self.page_size = page_size
+        self.partitions = list(partitions) if partitions else [(None, None)]
+        self.max_workers = max_workers
+        self.key_field = key_field
+        self.fields = list(fields) if fields is not None else None
+
+    @staticmethod
+    def _default_fields(index_name: str, key_field: str, credential: AzureKeyCredential) -> List[str]:
+        # selecting a field the index lacks fails the query, so 'page' only if present
+        index = SearchIndexClient(endpoint=settings.AZURE_SEARCH_ENDPOINT,
+                                  credential=credential).get_index(index_name)
+        fields = [key_field, "content"]
+        if any(f.name == "page" for f in index.fields):
+            fields.append("page")
+        return fields
+
+    def _to_doc(self, hit: Any) -> Document:
+        metadata = {
+            "id":       hit[self.key_field],
+            "chunk_id": hit[self.key_field],
+            "source":   self.index_name,
+            "page":     hit.get("page", 0),
+        }
+        return Document(page_content=hit["content"], metadata=metadata)
+
+    def _filter(self, lo: Optional[str], hi: Optional[str], after: Optional[str]) -> Optional[str]:
+        key = self.key_field
+        clauses = []
+        if after is not None:
+            clauses.append(f"{key} gt {_quote(after)}")
+        elif lo is not None:
+            clauses.append(f"{key} ge {_quote(lo)}")
+        if hi is not None:
+            clauses.append(f"{key} lt {_quote(hi)}")
+        return " and ".join(clauses) or None
+
+    def iter_pages(self, key_range: KeyRange = (None, None)) -> Iterator[List[Document]]:
+        """Pages of one key range, in key order."""
+        lo, hi = key_range
+        after: Optional[str] = None
+        while True:
+            results = self.client.search(
+                search_text="*",
+                filter=self._filter(lo, hi, after),
+                order_by=[f"{self.key_field} asc"],
+                select=self.fields,
+                top=self.page_size,
+            )
+            page = [self._to_doc(hit) for hit in results]
+            if page:
+                yield page
+            if len(page) < self.page_size:
+                return
+            after = page[-1].metadata["id"]
+
+    def iter_chunks(self) -> Iterator[Document]:
+        """Every document in the index, streamed page by page."""
+        if len(self.partitions) == 1 or self.max_workers <= 1:
+            for key_range in self.partitions:
+                for page in self.iter_pages(key_range):
+                    yield from page
+            return
+
+        # partitions fetched concurrently; a bounded queue keeps memory flat
+        pages: "queue.Queue" = queue.Queue(maxsize=2 * self.max_workers)
+        stop = threading.Event()
+
+        def fetch(key_range: KeyRange) -> None:
+            try:
+                for page in self.iter_pages(key_range):
+                    if stop.is_set():
+                        return
+                    pages.put(page)
+            except Exception as e:
+                pages.put(e)
+            finally:
+                pages.put(_DONE)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for key_range in self.partitions:
+                pool.submit(fetch, key_range)
+            remaining = len(self.partitions)
+            try:
+                while remaining:
+                    item = pages.get()
+                    if item is _DONE:
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield from item
+            finally:
+                # unblock workers if the consumer stopped early
+                stop.set()
+                while remaining:
+                    if pages.get() is _DONE:
+                        remaining -= 1
 
     def load_chunks(self) -> List[Document]:
-        docs = []
-        # you can tune `search_text="*"` & `top=` as needed
-        results = self.client.search(search_text="*", top=1000)
-        for hit in results:
-            metadata = {
-                "chunk_id": hit["id"],
-                "page": hit.get("page", 0),
-            }
-            docs.append(Document(
-                page_content=hit["content"],
-                metadata=metadata
-            ))
-        return docs
\ No newline at end of file
+        return list(self.iter_chunks())
@@ -0,0 +1,102 @@
+# benchmarks.py
+"""
+Recall-vs-latency reports for dense retrieval.
+
+Every ground-truth question is embedded once (through the embedding cache)
+and searched exactly to get the true top-k.  It is then searched again with
+each ANN setting (`ef_search` / `probes`), or each quantised first pass on the
+NumPy backend.  Recall@k is the overlap with the exact ids.  Latencies are per
+query and cover search time only.
+"""
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+from db import VectorDB
+from vector_store import NumpyVectorStore, get_store
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95))}
+
+
+def ann_recall_report(questions: Sequence[str],
+                      k: int = 10,
+                      ef_search_values: Sequence[int] = (40, 100, 200, 400),
+                      probes_values: Sequence[int] = (),
+                      vdb: Optional[VectorDB] = None) -> List[Dict[str, float]]:
+    """One row per setting: recall@k and latency percentiles, exact search first."""
+    vdb = vdb or VectorDB()
+    vectors = vdb.embeddings.embed_documents(list(questions))
+
+    def run(**knobs):
+        ids, latencies = [], []
+        for vec in vectors:
+            t0 = time.perf_counter()
+            docs = vdb.dense_search(vec, k=k, **knobs)
+            latencies.append(time.perf_counter() - t0)
+            ids.append({d.metadata["id"] for d in docs})
+        return ids, latencies
+
+    exact_ids, exact_lat = run(exact=True)
+    rows = [{"setting": "exact", "recall": 1.0, **_percentiles(exact_lat)}]
+
+    settings_to_try = ([("ef_search", v) for v in ef_search_values]
+                       + [("probes", v) for v in probes_values])
+    for knob, value in settings_to_try:
+        ids, latencies = run(**{knob: value})
+        recall = np.mean([len(got & want) / max(len(want), 1) for got, want in zip(ids, exact_ids)])
+        rows.append({"setting": f"{knob}={value}", "recall": float(recall), **_percentiles(latencies)})
+    return rows
+
+
+def quantization_report(questions: Sequence[str],
+                        k: int = 10,
+                        modes: Sequence[str] = ("int8", "binary"),
+                        rescore: int = None,
+                        store: Optional[NumpyVectorStore] = None,
+                        vdb: Optional[VectorDB] = None) -> List[Dict[str, float]]:
+    """
+    Quantised first pass + float32 rescoring vs the exact float32 scan on the
+    NumPy store: recall@k, latency percentiles and scan memory per mode.
+    Without an explicit `store` this needs VECTOR_BACKEND="numpy".
+    """
+    if store is None:
+        if settings.VECTOR_BACKEND != "numpy":
+            raise RuntimeError(f"quantization_report measures the NumPy vector store, but VECTOR_BACKEND "
+                               f"is '{settings.VECTOR_BACKEND}'; build with VECTOR_BACKEND=numpy first")
+        store = get_store()
+    if not store.count:
+        raise RuntimeError(f"The NumPy vector store under {store.root} is empty; run `cli.py build` first")
+    vectors = (vdb or VectorDB()).embeddings.embed_documents(list(questions))
+
+    def run(mode):
+        store.search(vectors[:1], k=k, quantization=mode, rescore=rescore)   # warm: load codes
+        ids, latencies = [], []
+        for vec in vectors:
+            t0 = time.perf_counter()
+            hits = store.search(vec, k=k, quantization=mode, rescore=rescore)[0]
+            latencies.append(time.perf_counter() - t0)
+            ids.append({r for r, _ in hits})
+        return ids, latencies
+
+    exact_ids, exact_lat = run("none")
+    rows = [{"setting": "float32", "recall": 1.0, "memory_mb": store.memory_bytes() / 2**20,
+             **_percentiles(exact_lat)}]
+    for mode in modes:
+        ids, latencies = run(mode)
+        recall = np.mean([len(got & want) / max(len(want), 1) for got, want in zip(ids, exact_ids)])
+        rows.append({"setting": mode, "recall": float(recall), "memory_mb": store.memory_bytes(mode) / 2**20,
+                     **_percentiles(latencies)})
+    return rows
+
+
+def print_report(rows: List[Dict[str, float]], k: int = 10) -> None:
+    mem = "memory_mb" in rows[0]
+    print(f"\n{'setting':<16}{f'recall@{k}':>10}{'p50 ms':>10}{'p95 ms':>10}" + (f"{'MB':>10}" if mem else ""))
+    for row in rows:
+        print(f"{row['setting']:<16}{row['recall']:>10.3f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              + (f"{row['memory_mb']:>10.1f}" if mem else ""))
@@ -0,0 +1,365 @@
+# bm25_index.py
+"""
+Persistent, memory-mapped BM25 inverted index.
+
+Layout (under settings.CACHE_DIR/bm25/<collection>/):
+  manifest.json            segment list, collection version, corpus stats
+  seg_<n>/terms.npy        sorted uint64 term hashes (the vocabulary)
+  seg_<n>/offsets.npy      int64, postings of terms[i] are [offsets[i], offsets[i+1])
+  seg_<n>/docs.npy         int32 segment-local doc numbers, ascending per term
+  seg_<n>/tfs.npy          uint16 term frequencies
+  seg_<n>/max_tf.npy       uint16 per-term max tf   } per-term score
+  seg_<n>/min_len.npy      int32 per-term min doc len } upper bounds
+  seg_<n>/doc_lens.npy     int32 doc lengths in tokens
+  seg_<n>/doc_keys.npy     uint64 chunk-id hashes (corpus.hash64)
+
+Everything is np.load(mmap_mode="r"), so opening an index costs a few page
+faults regardless of corpus size.  `add()` writes a new segment (incremental
+ingest); segments are merged once there are more than MAX_SEGMENTS.
+Queries score postings with vectorised NumPy and use MaxScore pruning: once
+the low-impact terms left can no longer lift an unseen doc into the top-k,
+they are only scored for the surviving candidates.
+"""
+import json
+import pathlib
+import re
+import shutil
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+from corpus import Corpus, hash64
+
+_TOKEN = re.compile(r"\w+")
+
+K1 = 1.5
+B = 0.75
+MAX_SEGMENTS = 8
+
+_SEGMENT_ARRAYS = ("terms", "offsets", "docs", "tfs", "max_tf", "min_len", "doc_lens", "doc_keys")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _term_hashes(tokens: Iterable[str], memo: Dict[str, int]) -> List[int]:
+    out = []
+    for t in tokens:
+        h = memo.get(t)
+        if h is None:
+            h = memo[t] = hash64(t)
+        out.append(h)
+    return out
+
+
+# ───────────────────────── segments ──────────────────────────
+class _Segment:
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        for name in _SEGMENT_ARRAYS:
+            setattr(self, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    def lookup(self, term_hashes: np.ndarray) -> np.ndarray:
+        """Vocabulary row of each term, -1 when absent."""
+        if not len(self.terms):
+            return np.full(len(term_hashes), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.terms, term_hashes), len(self.terms) - 1)
+        return np.where(self.terms[rows] == term_hashes, rows, -1)
+
+    def df(self, rows: np.ndarray) -> np.ndarray:
+        ok = rows >= 0
+        out = np.zeros(len(rows), dtype=np.int64)
+        out[ok] = self.offsets[rows[ok] + 1] - self.offsets[rows[ok]]
+        return out
+
+    def postings(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        return self.docs[lo:hi], self.tfs[lo:hi]
+
+    def triples(self, doc_base: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(term, doc, tf) for every posting, docs shifted by doc_base."""
+        counts = np.diff(self.offsets)
+        return (np.repeat(np.asarray(self.terms), counts),
+                np.asarray(self.docs, dtype=np.int64) + doc_base,
+                np.asarray(self.tfs))
+
+
+def _write_segment(path: pathlib.Path,
+                   terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                   doc_lens: np.ndarray, doc_keys: np.ndarray) -> None:
+    """Write a segment from unsorted (term, doc, tf) triples."""
+    order = np.lexsort((docs, terms))
+    terms, docs, tfs = terms[order], docs[order], tfs[order]
+    vocab, starts = np.unique(terms, return_index=True)
+    offsets = np.append(starts, len(terms)).astype(np.int64)
+
+    # per-term bounds for MaxScore: max tf and shortest doc in the postings
+    max_tf = np.maximum.reduceat(tfs, starts) if len(tfs) else np.zeros(0, np.uint16)
+    lens = doc_lens[docs] if len(docs) else np.zeros(0, np.int32)
+    min_len = np.minimum.reduceat(lens, starts) if len(lens) else np.zeros(0, np.int32)
+
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    arrays = {
+        "terms":    vocab.astype(np.uint64),
+        "offsets":  offsets,
+        "docs":     docs.astype(np.int32),
+        "tfs":      tfs.astype(np.uint16),
+        "max_tf":   max_tf.astype(np.uint16),
+        "min_len":  min_len.astype(np.int32),
+        "doc_lens": doc_lens.astype(np.int32),
+        "doc_keys": doc_keys.astype(np.uint64),
+    }
+    for name, arr in arrays.items():
+        np.save(tmp / f"{name}.npy", arr)
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+
+
+# ───────────────────────── index ──────────────────────────
+class BM25Index:
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+        self.manifest = json.loads((root / "manifest.json").read_text())
+        self.segments = [_Segment(root / name) for name in self.manifest["segments"]]
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @property
+    def n_docs(self) -> int:
+        return self.manifest["n_docs"]
+
+    @property
+    def avgdl(self) -> float:
+        return self.manifest["total_len"] / max(self.n_docs, 1)
+
+    # ── construction ──
+    @staticmethod
+    def path_for(collection: str) -> pathlib.Path:
+        return pathlib.Path(settings.CACHE_DIR) / "bm25" / collection
+
+    @classmethod
+    def build(cls, root: pathlib.Path, corpus: Corpus, version: str) -> "BM25Index":
+        """(Re)build from scratch as a single segment."""
+        shutil.rmtree(root, ignore_errors=True)
+        root.mkdir(parents=True)
+        ids = (corpus.id(i) for i in range(len(corpus)))
+        n, total = cls._write_from_texts(root / "seg_0", ids, corpus.texts())
+        cls._write_manifest(root, ["seg_0"], version, n, total)
+        return cls(root)
+
+    @staticmethod
+    def _write_from_texts(path: pathlib.Path, ids: Iterable[str], texts: Iterable[str]) -> Tuple[int, int]:
+        memo: Dict[str, int] = {}
+        terms: List[int] = []
+        docs: List[int] = []
+        tfs: List[int] = []
+        doc_lens: List[int] = []
+        doc_keys: List[int] = []
+        for doc, (doc_id, text) in enumerate(zip(ids, texts)):
+            tokens = tokenize(text)
+            counts = Counter(_term_hashes(tokens, memo))
+            terms.extend(counts.keys())
+            tfs.extend(min(c, 65535) for c in counts.values())
+            docs.extend([doc] * len(counts))
+            doc_lens.append(len(tokens))
+            doc_keys.append(hash64(doc_id))
+        _write_segment(path,
+                       np.asarray(terms, dtype=np.uint64),
+                       np.asarray(docs, dtype=np.int64),
+                       np.asarray(tfs, dtype=np.uint16),
+                       np.asarray(doc_lens, dtype=np.int32),
+                       np.asarray(doc_keys, dtype=np.uint64))
+        return len(doc_lens), int(sum(doc_lens))
+
+    @staticmethod
+    def _write_manifest(root: pathlib.Path, segments: List[str], version: str, n_docs: int, total_len: int):
+        manifest = {"segments": segments, "version": version, "n_docs": n_docs, "total_len": total_len}
+        tmp = root / "manifest.json.tmp"
+        tmp.write_text(json.dumps(manifest))
+        tmp.replace(root / "manifest.json")
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], version: str) -> "BM25Index":
+        """
+        Append docs as a new segment and return the reopened index.
+        Ids already indexed are skipped (chunk ids are content-addressed).
+        """
+        known = set()
+        for seg in self.segments:
+            known.update(np.asarray(seg.doc_keys).tolist())
+        new = [(i, t) for i, t in zip(ids, texts) if hash64(i) not in known]
+
+        segments = list(self.manifest["segments"])
+        n_docs, total = self.n_docs, self.manifest["total_len"]
+        if new:
+            name = f"seg_{max(int(s.split('_')[1]) for s in segments) + 1 if segments else 0}"
+            n, added = self._write_from_texts(self.root / name, (i for i, _ in new), (t for _, t in new))
+            segments.append(name)
+            n_docs, total = n_docs + n, total + added
+        self._write_manifest(self.root, segments, version, n_docs, total)
+
+        index = BM25Index(self.root)
+        if len(index.segments) > MAX_SEGMENTS:
+            index = index.merge()
+        return index
+
+    def merge(self) -> "BM25Index":
+        """Fold every segment into one."""
+        parts, base = [], 0
+        for seg in self.segments:
+            parts.append(seg.triples(base))
+            base += len(seg)
+        name = f"seg_{max(int(s.split('_')[1]) for s in self.manifest['segments']) + 1}"
+        _write_segment(self.root / name,
+                       np.concatenate([p[0] for p in parts]),
+                       np.concatenate([p[1] for p in parts]),
+                       np.concatenate([p[2] for p in parts]),
+                       np.concatenate([np.asarray(s.doc_lens) for s in self.segments]),
+                       np.concatenate([np.asarray(s.doc_keys) for s in self.segments]))
+        old = self.manifest["segments"]
+        self._write_manifest(self.root, [name], self.version, self.n_docs, self.manifest["total_len"])
+        for seg_name in old:
+            shutil.rmtree(self.root / seg_name, ignore_errors=True)
+        return BM25Index(self.root)
+
+    # ── querying ──
+    def _query_terms(self, query: str) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+        """Unique query term hashes, their idf, and each segment's vocabulary rows."""
+        hashes = np.asarray(sorted({hash64(t) for t in tokenize(query)}), dtype=np.uint64)
+        rows = [seg.lookup(hashes) for seg in self.segments]
+        df = sum((seg.df(r) for seg, r in zip(self.segments, rows)), np.zeros(len(hashes), np.int64))
+        idf = np.log((self.n_docs - df + 0.5) / (df + 0.5) + 1.0)
+        return hashes, idf, rows
+
+    def _term_weights(self, seg: _Segment, docs: np.ndarray, tfs: np.ndarray, idf: float) -> np.ndarray:
+        tf = tfs.astype(np.float32)
+        norm = K1 * (1 - B + B * seg.doc_lens[docs] / self.avgdl)
+        return idf * tf * (K1 + 1) / (tf + norm)
+
+    def _search_segment(self, seg: _Segment, rows: np.ndarray, idf: np.ndarray, k: int):
+        present = np.flatnonzero(rows >= 0)
+        if not len(present) or not len(seg):
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+
+        # score upper bound of each term in this segment, highest impact first
+        max_tf = seg.max_tf[rows[present]].astype(np.float32)
+        min_len = seg.min_len[rows[present]]
+        ub = idf[present] * max_tf * (K1 + 1) / (max_tf + K1 * (1 - B + B * min_len / self.avgdl))
+        by_impact = np.argsort(-ub)
+        order = present[by_impact]
+        # remaining[i] = best score the terms order[i:] can still add to a doc
+        remaining = ub[by_impact][::-1].cumsum()[::-1]
+
+        scores = np.zeros(len(seg), dtype=np.float32)
+        theta = 0.0
+        for i, t in enumerate(order):
+            if theta > 0 and remaining[i] <= theta:
+                # MaxScore: untouched docs can't reach theta any more, so the
+                # rest of the terms only need scoring for live candidates
+                cand = np.flatnonzero(scores + remaining[i] > theta)
+                for t2 in order[i:]:
+                    docs, tfs = seg.postings(rows[t2])
+                    pos = np.searchsorted(docs, cand)
+                    pos = np.minimum(pos, len(docs) - 1)
+                    hit = docs[pos] == cand
+                    scores[cand[hit]] += self._term_weights(seg, cand[hit], tfs[pos[hit]], idf[t2])
+                break
+            docs, tfs = seg.postings(rows[t])
+            scores[docs] += self._term_weights(seg, docs, tfs, idf[t])
+            if len(scores) > k:
+                theta = float(np.partition(scores, -k)[-k])
+
+        top = self._top_k(scores, k)
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        if len(scores) > k:
+            idx = np.argpartition(scores, -k)[-k:]
+        else:
+            idx = np.arange(len(scores))
+        return idx[np.argsort(-scores[idx], kind="stable")]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Top-k (chunk-id hash, score) pairs, best first."""
+        _, idf, rows = self._query_terms(query)
+        keys, scores = [], []
+        for seg, seg_rows in zip(self.segments, rows):
+            docs, s = self._search_segment(seg, seg_rows, idf, k)
+            keys.append(np.asarray(seg.doc_keys[docs]) if len(docs) else np.zeros(0, np.uint64))
+            scores.append(s)
+        if not keys:
+            return []
+        keys, scores = np.concatenate(keys), np.concatenate(scores)
+        top = self._top_k(scores, k)
+        return [(int(keys[i]), float(scores[i])) for i in top]
+
+    def score_texts(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        """BM25 of arbitrary passages against `query`, using this index's idf and avgdl."""
+        hashes, idf, _ = self._query_terms(query)
+        weights = dict(zip(hashes.tolist(), idf.tolist()))
+        out = np.zeros(len(texts), dtype=np.float32)
+        for j, text in enumerate(texts):
+            tokens = tokenize(text)
+            norm = K1 * (1 - B + B * len(tokens) / self.avgdl)
+            for h, tf in Counter(hash64(t) for t in tokens).items():
+                if h in weights:
+                    out[j] += weights[h] * tf * (K1 + 1) / (tf + norm)
+        return out
+
+
+# ───────────────────────── shared access ──────────────────────────
+_LOCK = threading.Lock()
+_INDEXES: Dict[Tuple[str, str], BM25Index] = {}
+
+
+def get_index(corpus: Corpus, version: str, collection: str = None) -> BM25Index:
+    """
+    The index matching `version`: opened from disk when its manifest matches,
+    otherwise rebuilt from the corpus snapshot.
+    """
+    collection = collection or settings.COLLECTION
+    key = (collection, version)
+    with _LOCK:
+        if key not in _INDEXES:
+            root = BM25Index.path_for(collection)
+            index: Optional[BM25Index] = None
+            if (root / "manifest.json").exists():
+                index = BM25Index(root)
+                if index.version != version:
+                    index = None
+            if index is None:
+                print(f"🔤 Building BM25 index for '{collection}' ({len(corpus)} chunks)…")
+                index = BM25Index.build(root, corpus, version)
+            _INDEXES[key] = index
+        return _INDEXES[key]
+
+
+def add_to_index(ids: Sequence[str], texts: Sequence[str],
+                 version_before: str, version_after: str, collection: str = None) -> None:
+    """
+    Incrementally index freshly ingested chunks.  Only applies when the index
+    on disk was current before the ingest; otherwise it is left stale and gets
+    rebuilt on next use.
+    """
+    collection = collection or settings.COLLECTION
+    root = BM25Index.path_for(collection)
+    if not (root / "manifest.json").exists():
+        return
+    with _LOCK:
+        index = BM25Index(root)
+        if index.version != version_before:
+            return
+        index = index.add(ids, texts, version_after)
+        _INDEXES[(collection, version_after)] = index
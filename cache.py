@@ -0,0 +1,76 @@
+# cache.py
+"""
+Tiny persistent key/value cache on SQLite.
+
+Used for results that are expensive to recompute (LLM-judged metrics, LLM
+scores, embeddings).  One file per cache under settings.CACHE_DIR; WAL mode
+lets several threads and processes share it.
+"""
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable
+
+from config import settings
+
+
+def hash_key(*parts: Any) -> str:
+    """Stable sha256 over JSON-serialisable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SQLiteCache:
+    def __init__(self,
+                 name: str,
+                 encode: Callable[[Any], Any] = json.dumps,
+                 decode: Callable[[Any], Any] = json.loads):
+        cache_dir = pathlib.Path(settings.CACHE_DIR)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.path = cache_dir / f"{name}.sqlite"
+        self.encode = encode
+        self.decode = decode
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Any] = {}
+        conn = self._conn()
+        for i in range(0, len(keys), 500):          # stay under SQLite's variable limit
+            batch = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, value FROM kv WHERE key IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            for key, value in rows:
+                found[key] = self.decode(value)
+        return found
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        if not items:
+            return
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+                [(k, self.encode(v)) for k, v in items.items()],
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
@@ -1,11 +1,57 @@
 # cli.py
 
 import argparse
+import json
 import sys
+import time
+from collections import defaultdict
 from pathlib import Path
+from typing import Any, Dict, Iterator, List
 
 from autorag_pipeline import AutoRAGPipeline
 from config import settings
+from executor import latency_summary
+
+
+def _read_questions(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                yield rec if isinstance(rec, dict) else {"question": rec}
+
+
+def answer_file(pipeline: AutoRAGPipeline, questions_file: Path, out_path: Path,
+                batch_size: int, concurrency: int) -> None:
+    """Answer every question of a JSONL file, appending answers as batches complete."""
+    inputs: List[Dict[str, Any]] = []
+
+    def questions() -> Iterator[str]:
+        for rec in _read_questions(questions_file):
+            inputs.append(rec)
+            yield rec["question"]
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    done = 0
+    start = time.perf_counter()
+    with open(out_path, "w") as out:
+        for records, batch_timings in pipeline.stream(questions(), batch_size=batch_size,
+                                                      concurrency=concurrency):
+            for rec in records:
+                # input fields (ids, …) are kept alongside the answer
+                out.write(json.dumps({**inputs[rec["index"]], **rec}) + "\n")
+            out.flush()
+            for stage, secs in batch_timings.items():
+                timings[stage].append(secs)
+            done += len(records)
+            print(f"  ✓ {done} answered ({done / (time.perf_counter() - start):.2f} q/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ {done} answers written to {out_path} in {elapsed:.1f}s "
+          f"({done / elapsed if elapsed else 0.0:.2f} questions/s)")
+    print(f"\n{'stage (per batch)':<20}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, row in latency_summary(timings).items():
+        print(f"{stage:<20}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['max_ms']:>10.1f}")
 
 
 def main():
@@ -19,6 +65,8 @@ def main():
                        help="Path to PDF file to chunk & index")
     grp_b.add_argument("--index-name", type=str,
                        help="Azure Search index name to read from")
+    build.add_argument("--overwrite", action="store_true",
+                       help="Rebuild even if ground_truth.json is already complete")
 
     # --- ASK subcommand ---
     ask = sub.add_parser("ask", help="Optimize pipeline & answer")
@@ -27,14 +75,48 @@ def main():
                        help="Path to PDF file (if reusing local index)")
     grp_a.add_argument("--index-name", type=str,
                        help="Azure Search index name to query")
-    ask.add_argument("--q", "--question", dest="question", required=True,
-                     help="The question to ask")
+    grp_q = ask.add_mutually_exclusive_group(required=True)
+    grp_q.add_argument("--q", "--question", dest="question",
+                       help="The question to ask")
+    grp_q.add_argument("--questions-file", type=Path,
+                       help="JSONL file: one {\"question\": ...} object (or JSON string) per line")
+    ask.add_argument("--out", type=Path, default=Path("answers.jsonl"),
+                     help="Where --questions-file answers are written (JSONL, as they complete)")
+    ask.add_argument("--concurrency", type=int, default=settings.ASK_CONCURRENCY,
+                     help="Batches of questions in flight")
+    ask.add_argument("--batch-size", type=int, default=settings.PIPELINE_BATCH_SIZE,
+                     help="Questions per stage-wise batch")
+    ask.add_argument("--reoptimise", action="store_true",
+                     help="Ignore the saved pipeline and re-run greedy search")
+
+    # --- ANN-REPORT subcommand ---
+    ann = sub.add_parser("ann-report",
+                         help="Recall vs latency of the vector index on the ground-truth questions")
+    ann.add_argument("--gt", type=Path, default=Path("ground_truth.json"),
+                     help="Ground-truth file whose questions are used as queries")
+    ann.add_argument("--k", type=int, default=10)
+    ann.add_argument("--ef-search", type=int, nargs="*", default=[40, 100, 200, 400],
+                     help="HNSW ef_search values to try")
+    ann.add_argument("--probes", type=int, nargs="*", default=[],
+                     help="IVFFlat probes values to try")
+    ann.add_argument("--rebuild", choices=["hnsw", "ivfflat"],
+                     help="(Re)build the collection's index with this type first")
+
+    # --- QUANT-REPORT subcommand ---
+    quant = sub.add_parser("quant-report",
+                           help="Quantised vs float32 dense search on the NumPy vector backend")
+    quant.add_argument("--gt", type=Path, default=Path("ground_truth.json"),
+                       help="Ground-truth file whose questions are used as queries")
+    quant.add_argument("--k", type=int, default=10)
+    quant.add_argument("--modes", nargs="*", default=["int8", "binary"], choices=["int8", "binary"])
+    quant.add_argument("--rescore", type=int, default=settings.VECTOR_RESCORE_FACTOR,
+                       help="Quantised candidates per result rescored in float32")
 
     args = parser.parse_args()
 
     if args.cmd == "build":
         if args.pdf:
-            AutoRAGPipeline.build_from_pdf(str(args.pdf))
+            AutoRAGPipeline.build_from_pdf(str(args.pdf), overwrite=args.overwrite)
         else:
             # Azure‐index mode; endpoint is drawn from config.AZURE_SEARCH_ENDPOINT
             if not settings.AZURE_SEARCH_ENDPOINT:
@@ -42,22 +124,50 @@ def main():
             AutoRAGPipeline.build_from_index(
                 index_name=args.index_name,
                 qa_per_chunk=settings.QA_PER_CHUNK,
+                overwrite=args.overwrite,
             )
 
     elif args.cmd == "ask":
         if args.pdf:
-            pipeline = AutoRAGPipeline.ask_via_pdf(str(args.pdf))
+            pipeline = AutoRAGPipeline.ask_via_pdf(str(args.pdf),
+                                                   reoptimise=args.reoptimise)
         else:
             if not settings.AZURE_SEARCH_ENDPOINT:
                 sys.exit("ERROR: AZURE_SEARCH_ENDPOINT not set in config")
             pipeline = AutoRAGPipeline.ask_via_index(
                 index_name=args.index_name,
+                reoptimise=args.reoptimise,
             )
+        if args.questions_file:
+            answer_file(pipeline, args.questions_file, args.out,
+                        batch_size=args.batch_size, concurrency=args.concurrency)
+            return
         out = pipeline(args.question)
         print("\n➤ PROMPT\n", out["prompt"])
         print("\n➤ CONTEXTS\n", *out["retrieved_contexts"], sep="\n\n---\n\n")
         print("\n➤ ANSWER\n", out["answer"])
 
+    elif args.cmd == "ann-report":
+        from benchmarks import ann_recall_report, print_report
+        from db import VectorDB
+
+        vdb = VectorDB()
+        if args.rebuild:
+            vdb.create_ann_index(kind=args.rebuild, replace=True)
+        questions = [rec["question"] for rec in json.loads(args.gt.read_text())]
+        rows = ann_recall_report(questions, k=args.k, ef_search_values=args.ef_search,
+                                 probes_values=args.probes, vdb=vdb)
+        print_report(rows, k=args.k)
+
+    elif args.cmd == "quant-report":
+        from benchmarks import quantization_report, print_report
+
+        if settings.VECTOR_BACKEND != "numpy":
+            sys.exit(f"ERROR: quant-report needs VECTOR_BACKEND=numpy (it is '{settings.VECTOR_BACKEND}')")
+        questions = [rec["question"] for rec in json.loads(args.gt.read_text())]
+        rows = quantization_report(questions, k=args.k, modes=args.modes, rescore=args.rescore)
+        print_report(rows, k=args.k)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
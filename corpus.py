@@ -0,0 +1,194 @@
+# corpus.py
+"""
+Shared, read-only snapshot of the indexed corpus.
+
+Loaded once per collection version with a direct table scan and kept in a
+compact array-backed form: every text lives in one UTF-8 blob addressed by
+offsets, next to arrays of ids, page numbers and source indices.  Snapshots
+are cached on disk (memory-mapped on load) under
+settings.CACHE_DIR/corpus/<collection>/<version>/, so a new process reads
+them back instead of scanning Postgres again.
+"""
+import hashlib
+import json
+import pathlib
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+import numpy as np
+from langchain.schema import Document
+
+from config import settings
+from db import collection_version, scan_collection
+from page_store import page_id
+
+
+def hash64(text: str) -> int:
+    """64-bit content hash used to address chunk ids and terms in NumPy arrays."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+_ARRAYS = ("text_blob", "text_offsets", "id_blob", "id_offsets", "pages", "source_idx",
+           "key_order", "sorted_keys")
+# bump whenever _ARRAYS or their layout change; other snapshots are rebuilt
+SNAPSHOT_FORMAT = 2
+
+
+class Corpus:
+    def __init__(self,
+                 text_blob: np.ndarray,
+                 text_offsets: np.ndarray,
+                 id_blob: np.ndarray,
+                 id_offsets: np.ndarray,
+                 pages: np.ndarray,
+                 source_idx: np.ndarray,
+                 sources: List[str],
+                 key_order: Optional[np.ndarray] = None,
+                 sorted_keys: Optional[np.ndarray] = None):
+        self.text_blob = text_blob          # uint8, all texts back to back
+        self.text_offsets = text_offsets    # int64, len(corpus) + 1
+        self.id_blob = id_blob
+        self.id_offsets = id_offsets
+        self.pages = pages                  # int32, -1 when unknown
+        self.source_idx = source_idx        # int32 index into self.sources
+        self.sources = sources
+        self.version: Optional[str] = None   # collection version, set by get_corpus()
+        # chunk-id hashes in sorted order + their positions, for id lookups
+        self.key_order = key_order
+        self.sorted_keys = sorted_keys
+
+    # ───────────────────────── construction ──────────────────────────
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, Dict[str, Any]]]) -> "Corpus":
+        texts, ids = bytearray(), bytearray()
+        text_offsets, id_offsets = [0], [0]
+        pages: List[int] = []
+        keys: List[int] = []
+        source_idx: List[int] = []
+        sources: Dict[str, int] = {}
+
+        for row_id, text, md in rows:
+            texts += text.encode("utf-8")
+            text_offsets.append(len(texts))
+            ids += str(row_id).encode("utf-8")
+            id_offsets.append(len(ids))
+            keys.append(hash64(str(row_id)))
+            page = md.get("page")
+            pages.append(int(page) if page is not None else -1)
+            source_idx.append(sources.setdefault(str(md.get("source", "")), len(sources)))
+
+        keys = np.asarray(keys, dtype=np.uint64)
+        key_order = np.argsort(keys, kind="stable")
+        return cls(
+            np.frombuffer(bytes(texts), dtype=np.uint8),
+            np.asarray(text_offsets, dtype=np.int64),
+            np.frombuffer(bytes(ids), dtype=np.uint8),
+            np.asarray(id_offsets, dtype=np.int64),
+            np.asarray(pages, dtype=np.int32),
+            np.asarray(source_idx, dtype=np.int32),
+            list(sources),
+            key_order,
+            keys[key_order],
+        )
+
+    def save(self, path: pathlib.Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "sources.json").unlink(missing_ok=True)
+        for name in _ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+        (path / "format").write_text(str(SNAPSHOT_FORMAT))
+        # written last: its presence marks a complete snapshot
+        (path / "sources.json").write_text(json.dumps(self.sources))
+
+    @staticmethod
+    def is_current(path: pathlib.Path) -> bool:
+        """Whether `path` holds a complete snapshot in this SNAPSHOT_FORMAT."""
+        try:
+            return ((path / "sources.json").exists()
+                    and int((path / "format").read_text()) == SNAPSHOT_FORMAT)
+        except (OSError, ValueError):
+            return False
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "Corpus":
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r")
+            for name in _ARRAYS
+        }
+        return cls(**arrays, sources=json.loads((path / "sources.json").read_text()))
+
+    # ───────────────────────── access ──────────────────────────
+    def __len__(self) -> int:
+        return len(self.text_offsets) - 1
+
+    def text(self, i: int) -> str:
+        return bytes(self.text_blob[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8")
+
+    def id(self, i: int) -> str:
+        return bytes(self.id_blob[self.id_offsets[i]:self.id_offsets[i + 1]]).decode("utf-8")
+
+    def source(self, i: int) -> str:
+        return self.sources[self.source_idx[i]]
+
+    def page(self, i: int) -> Optional[int]:
+        page = int(self.pages[i])
+        return page if page >= 0 else None
+
+    def texts(self) -> Iterable[str]:
+        return (self.text(i) for i in range(len(self)))
+
+    def document(self, i: int) -> Document:
+        return Document(
+            page_content=self.text(i),
+            metadata={"id": self.id(i), "source": self.source(i), "page": self.page(i),
+                      "page_id": page_id(self.source(i), self.page(i))},
+        )
+
+    def positions(self, keys: np.ndarray) -> np.ndarray:
+        """Snapshot positions of chunk-id hashes (see hash64), -1 when unknown."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(self):
+            return np.full(len(keys), -1, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self) - 1)
+        return np.where(self.sorted_keys[idx] == keys, self.key_order[idx], -1)
+
+    def position(self, doc: Document) -> Optional[int]:
+        """Snapshot position of a retrieved doc, looked up by its chunk id."""
+        doc_id = doc.metadata.get("id") or getattr(doc, "id", None)
+        if not doc_id:
+            return None
+        pos = int(self.positions(np.asarray([hash64(doc_id)], dtype=np.uint64))[0])
+        return pos if pos >= 0 else None
+
+    def same_source(self, i: int, j: int) -> bool:
+        return 0 <= j < len(self) and self.source_idx[i] == self.source_idx[j]
+
+
+# ───────────────────────── shared loader ──────────────────────────
+_CORPORA: Dict[Tuple[str, str], Corpus] = {}
+_LOCK = threading.Lock()
+
+
+def get_corpus(collection: str = None) -> Corpus:
+    """
+    The snapshot for the collection's current version: from this process's
+    memory, else from the on-disk cache, else from a table scan (then cached).
+    """
+    collection = collection or settings.COLLECTION
+    version = collection_version(collection)
+    key = (collection, version)
+
+    with _LOCK:
+        if key not in _CORPORA:
+            digest = hashlib.sha256(version.encode()).hexdigest()[:16]
+            path = pathlib.Path(settings.CACHE_DIR) / "corpus" / collection / digest
+            if Corpus.is_current(path):
+                corpus = Corpus.load(path)
+            else:
+                print(f"📚 Snapshotting collection '{collection}'…")
+                corpus = Corpus.from_rows(scan_collection(collection))
+                corpus.save(path)
+                print(f"📚 Snapshot holds {len(corpus)} chunks")
+            corpus.version = version
+            _CORPORA[key] = corpus
+        return _CORPORA[key]
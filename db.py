@@ -1,16 +1,161 @@
 """Very thin PGVector helper."""
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
+from langchain.schema import Document
 from langchain_community.vectorstores.pgvector import PGVector
 from langchain_openai import AzureOpenAIEmbeddings
 from config import settings
+from embedding_cache import CachedEmbeddings
+from vector_store import get_store
+
+
+def _dsn() -> str:
+    return settings.PGVECTOR_URL.replace("postgresql+psycopg2://", "postgresql://", 1)
+
+
+@contextmanager
+def pg_connect():
+    """Plain psycopg2 connection to the PGVector database; commits on success, always closes."""
+    conn = psycopg2.connect(_dsn())
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pg_pool(size: int = None) -> ThreadedConnectionPool:
+    """
+    The process-wide ThreadedConnectionPool, holding at least `size`
+    connections (settings.INGEST_WORKERS); a smaller pool is replaced, and
+    connections taken from it go back to it.
+    """
+    global _POOL
+    size = max(size or settings.INGEST_WORKERS, 1)
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.maxconn < size:
+            _POOL = ThreadedConnectionPool(1, size, _dsn())
+        return _POOL
+
+
+@contextmanager
+def pg_pooled():
+    """Connection from the shared pool (_pg_pool); commits on success and goes back to the pool."""
+    pool = _pg_pool()
+    conn = pool.getconn()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def collection_version(collection: str = None) -> str:
+    """
+    Cheap fingerprint of a collection's contents: row count plus a digest of
+    the row ids.  Any ingest (or delete) changes it.
+    """
+    collection = collection or settings.COLLECTION
+    if settings.VECTOR_BACKEND == "numpy":
+        return get_store(collection).version
+    with pg_connect() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT count(e.uuid),
+                   coalesce(md5(string_agg(e.uuid::text, ',' ORDER BY e.uuid)), '')
+            FROM langchain_pg_collection c
+            LEFT JOIN langchain_pg_embedding e ON e.collection_id = c.uuid
+            WHERE c.name = %s
+            """,
+            (collection,),
+        )
+        count, digest = cur.fetchone()
+    return f"{count}-{digest}"
+
+
+def scan_collection(collection: str = None,
+                    batch_size: int = 5000) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Stream every chunk of a collection as (id, text, metadata) straight from
+    the table, ordered by source and position.  Uses a server-side cursor, so
+    there is no row limit and memory stays flat.  `source_text` (the whole
+    document, copied into every chunk by older builds) is dropped from the
+    metadata; page text now lives in page_store.PageStore.
+    """
+    collection = collection or settings.COLLECTION
+    if settings.VECTOR_BACKEND == "numpy":
+        yield from get_store(collection).scan(batch_size)
+        return
+    with pg_connect() as conn:
+        with conn.cursor(name="autorag_scan") as cur:
+            cur.itersize = batch_size
+            cur.execute(
+                """
+                SELECT coalesce(e.custom_id, e.uuid::text),
+                       e.document,
+                       e.cmetadata - 'source_text'
+                FROM langchain_pg_embedding e
+                JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                WHERE c.name = %s
+                ORDER BY e.cmetadata->>'source',
+                         (e.cmetadata->>'chunk_index')::int NULLS LAST,
+                         (e.cmetadata->>'page')::int NULLS LAST,
+                         e.uuid
+                """,
+                (collection,),
+            )
+            for row_id, text, metadata in cur:
+                yield row_id, text or "", metadata or {}
+
 
 class VectorDB:
+    """
+    Vector store facade.  settings.VECTOR_BACKEND picks PGVector ("pgvector")
+    or the in-process NumPy store in vector_store.py ("numpy"); callers see
+    the same methods either way.
+    """
     def __init__(self):
-        self.embeddings = AzureOpenAIEmbeddings(
-            azure_endpoint=settings.OPENAI_ENDPOINT,
-            api_key=settings.OPENAI_API_KEY,
-            azure_deployment=settings.EMBEDDING_MODEL,   # often identical to model name
-            api_version="2024-02-15-preview",
+        self.embeddings = CachedEmbeddings(
+            AzureOpenAIEmbeddings(
+                azure_endpoint=settings.OPENAI_ENDPOINT,
+                api_key=settings.OPENAI_API_KEY,
+                azure_deployment=settings.EMBEDDING_MODEL,   # often identical to model name
+                api_version="2024-02-15-preview",
+            ),
+            deployment=settings.EMBEDDING_MODEL,
         )
+        self._collection_id = None
+        # rows stored by the current bulk_load(), None outside one
+        self._bulk: Optional[Dict[str, int]] = None
+        if settings.VECTOR_BACKEND == "numpy":
+            self.local = get_store()
+            self.vstore = None
+            return
+        self.local = None
         self.vstore = PGVector(
             connection_string=settings.PGVECTOR_URL,
             collection_name=settings.COLLECTION,
@@ -19,8 +164,313 @@ class VectorDB:
             use_jsonb=True,
         )
 
-    def upsert(self, docs):
-        self.vstore.add_documents(docs)
+    # ───────────────────────── bulk ingestion ──────────────────────────
+    def collection_uuid(self) -> str:
+        with pg_connect() as conn, conn.cursor() as cur:
+            cur.execute("SELECT uuid FROM langchain_pg_collection WHERE name = %s", (settings.COLLECTION,))
+            row = cur.fetchone()
+        if row is None:
+            raise RuntimeError(f"PGVector collection '{settings.COLLECTION}' does not exist; "
+                               f"run `cli.py build` first")
+        return str(row[0])
+
+    def ann_indexes(self) -> List[Tuple[str, str]]:
+        """(name, definition) of this collection's HNSW / IVFFlat index, if it exists."""
+        with pg_connect() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT indexname, indexdef FROM pg_indexes
+                WHERE tablename = 'langchain_pg_embedding'
+                  AND indexname = %s
+                  AND indexdef ~* 'USING (hnsw|ivfflat)'
+                """,
+                (self.ann_index_name(self.collection_uuid()),),
+            )
+            return cur.fetchall()
+
+    @contextmanager
+    def bulk_load(self) -> Iterator[None]:
+        """
+        Group bulk_upsert() calls into one load: this collection's ANN index
+        is dropped once on entry and rebuilt (or first built, if anything was
+        stored and ANN_INDEX is set) once on exit.  On the NumPy backend the
+        IVF is rebuilt on exit once a tenth of the rows are outside it.
+        Re-entrant: nested loads join the outer one.
+        """
+        if self._bulk is not None:
+            yield
+            return
+        self._bulk = {"stored": 0}
+        indexes = self.ann_indexes() if self.local is None else []
+        if indexes:
+            with pg_connect() as conn, conn.cursor() as cur:
+                for name, _ in indexes:
+                    cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+        try:
+            yield
+        finally:
+            stored, self._bulk = self._bulk["stored"], None
+            t0 = time.perf_counter()
+            if indexes:
+                with pg_connect() as conn, conn.cursor() as cur:
+                    for _, definition in indexes:
+                        cur.execute(definition)
+                print(f"🔌 Rebuilt vector index in {time.perf_counter() - t0:.1f}s")
+            elif self.local is not None:
+                # rebuild the IVF once a tenth of the rows are outside it (they are scanned exactly)
+                built = self.local.ivf_count
+                if settings.NUMPY_IVF_LISTS and stored and self.local.count - built > built // 10:
+                    self.local.build_ivf()
+                    print(f"🔌 Built IVF ({settings.NUMPY_IVF_LISTS} lists) in {time.perf_counter() - t0:.1f}s")
+            elif settings.ANN_INDEX != "none" and stored:
+                self.create_ann_index()
+                print(f"🔌 Built {settings.ANN_INDEX} index in {time.perf_counter() - t0:.1f}s")
+
+    def _insert_batch(self, collection_id: str, batch: List) -> Tuple[int, float, float]:
+        """Embed one batch and write it with a single multi-row INSERT."""
+        t0 = time.perf_counter()
+        vectors = self.embeddings.embed_documents([d.page_content for d in batch])
+        t1 = time.perf_counter()
+        if self.local is not None:
+            stored = self.local.add([d.metadata.get("id") or str(uuid.uuid4()) for d in batch],
+                                    [d.page_content for d in batch],
+                                    [d.metadata for d in batch],
+                                    vectors)
+            return stored, t1 - t0, time.perf_counter() - t1
+        rows = [
+            (str(uuid.uuid4()), collection_id, np.asarray(vec, dtype=np.float32),
+             d.page_content, Json(d.metadata), d.metadata.get("id") or None)
+            for d, vec in zip(batch, vectors)
+        ]
+        with pg_pooled() as conn:
+            register_vector(conn)
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO langchain_pg_embedding
+                        (uuid, collection_id, embedding, document, cmetadata, custom_id)
+                    VALUES %s
+                    """,
+                    rows,
+                    page_size=len(rows),
+                )
+        return len(rows), t1 - t0, time.perf_counter() - t1
+
+    def bulk_upsert(self, docs: Iterable, batch_size: int = None, workers: int = None) -> Dict[str, float]:
+        """
+        Bulk ingestion path: chunks are embedded in `batch_size` batches on
+        `workers` threads (through the embedding cache) and each batch is
+        written with one multi-row INSERT over a pooled connection (or
+        appended to the NumPy store).  Ids that are already stored are
+        skipped.  The collection's ANN index is managed by bulk_load(): wrap
+        several calls in one to drop and rebuild it only once.  Returns
+        throughput stats.
+        """
+        batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        workers = workers or settings.INGEST_WORKERS
+        collection_id = None
+        if self.local is None:
+            collection_id = self.collection_uuid()
+            _pg_pool(workers)           # one pooled connection per worker
+
+        stats = {"stored": 0, "skipped": 0, "embed_s": 0.0, "insert_s": 0.0}
+        start = time.perf_counter()
+        with self.bulk_load():
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                in_flight = set()
+                for batch in _batches(docs, batch_size):
+                    ids = [d.metadata.get("id") for d in batch]
+                    if all(ids):
+                        # ids are content-addressed, so an already-stored id is an unchanged chunk
+                        existing = self.existing_ids(ids)
+                        seen: Set[str] = set()
+                        new = []
+                        for d, i in zip(batch, ids):
+                            if i not in existing and i not in seen:
+                                seen.add(i)
+                                new.append(d)
+                        stats["skipped"] += len(batch) - len(new)
+                        batch = new
+                    if not batch:
+                        continue
+                    if len(in_flight) >= 2 * workers:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            self._add_stats(stats, fut.result())
+                    in_flight.add(pool.submit(self._insert_batch, collection_id, batch))
+                for fut in in_flight:
+                    self._add_stats(stats, fut.result())
+            self._bulk["stored"] += stats["stored"]
+
+        stats["wall_s"] = time.perf_counter() - start
+        stats["chunks_per_s"] = stats["stored"] / stats["wall_s"] if stats["wall_s"] else 0.0
+        print(f"🔌 {stats['stored']} new chunk(s) stored, {stats['skipped']} already present "
+              f"– {stats['chunks_per_s']:.1f} chunks/s "
+              f"(embed {stats['embed_s']:.1f}s, insert {stats['insert_s']:.1f}s across {workers} workers)")
+        return stats
+
+    @staticmethod
+    def _add_stats(stats: Dict[str, float], result: Tuple[int, float, float]) -> None:
+        stored, embed_s, insert_s = result
+        stats["stored"] += stored
+        stats["embed_s"] += embed_s
+        stats["insert_s"] += insert_s
+
+    # ───────────────────────── ANN index ──────────────────────────
+    @staticmethod
+    def ann_index_name(collection_id: str) -> str:
+        return f"ix_autorag_ann_{collection_id.replace('-', '')[:16]}"
+
+    def create_ann_index(self,
+                         kind: str = None,
+                         m: int = None,
+                         ef_construction: int = None,
+                         lists: int = None,
+                         replace: bool = False) -> str:
+        """
+        Build an HNSW or IVFFlat cosine index for this collection.  The
+        embedding column is an untyped `vector`, so the index is on
+        `embedding::vector(EMBEDDING_DIM)` and partial on the collection id;
+        dense_search() queries with the same expression.  Returns the index name.
+        """
+        if self.local is not None:
+            self.local.build_ivf(lists)
+            return "ivf"
+        kind = kind or settings.ANN_INDEX
+        if kind not in ("hnsw", "ivfflat"):
+            raise ValueError(f"Unknown ANN index type: {kind!r}")
+        collection_id = self.collection_uuid()
+        name = self.ann_index_name(collection_id)
+        if kind == "hnsw":
+            options = (f"m = {int(m or settings.HNSW_M)}, "
+                       f"ef_construction = {int(ef_construction or settings.HNSW_EF_CONSTRUCTION)}")
+        else:
+            options = f"lists = {int(lists or settings.IVF_LISTS)}"
+        with pg_connect() as conn, conn.cursor() as cur:
+            if replace:
+                cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+            cur.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS "{name}" ON langchain_pg_embedding
+                USING {kind} ((embedding::vector({int(settings.EMBEDDING_DIM)})) vector_cosine_ops)
+                WITH ({options})
+                WHERE collection_id = %s
+                """,
+                (collection_id,),
+            )
+        return name
+
+    def drop_ann_index(self) -> None:
+        if self.local is not None:
+            return
+        with pg_connect() as conn, conn.cursor() as cur:
+            cur.execute(f'DROP INDEX IF EXISTS "{self.ann_index_name(self.collection_uuid())}"')
+
+    def dense_search(self,
+                     query: Any,
+                     k: int = 10,
+                     ef_search: int = None,
+                     probes: int = None,
+                     exact: bool = False) -> List[Document]:
+        """
+        Cosine top-k over this collection.  `query` is a string or a vector.
+        `ef_search` / `probes` are set for this query only (SET LOCAL);
+        hnsw.ef_search is always at least k (pgvector caps it at 1000);
+        `exact=True` disables index scans to get the exact neighbours.  On the
+        NumPy backend `probes` is the number of IVF lists scanned.
+        """
+        return self.dense_search_many([query], k=k, ef_search=ef_search, probes=probes, exact=exact)[0]
+
+    def dense_search_many(self,
+                          queries: List[Any],
+                          k: int = 10,
+                          ef_search: int = None,
+                          probes: int = None,
+                          exact: bool = False) -> List[List[Document]]:
+        """
+        dense_search for a batch of queries: the strings among them are
+        embedded in one request, then all queries run as one matmul scan
+        (NumPy) or over one connection and transaction (PGVector).
+        """
+        texts = [q for q in queries if isinstance(q, str)]
+        embedded = iter(self.embeddings.embed_documents(texts) if texts else [])
+        vecs = [np.asarray(next(embedded) if isinstance(q, str) else q, dtype=np.float32) for q in queries]
+        if not vecs:
+            return []
+        if self.local is not None:
+            hits = self.local.search(np.vstack(vecs), k=k, nprobe=None if exact else probes)
+            return [[self._local_doc(r) for r, _ in h] for h in hits]
+        if self._collection_id is None:
+            self._collection_id = self.collection_uuid()
+        dim = int(settings.EMBEDDING_DIM)
+        results = []
+        with pg_connect() as conn:
+            register_vector(conn)
+            with conn.cursor() as cur:
+                if exact:
+                    cur.execute("SET LOCAL enable_indexscan = off")
+                # an HNSW scan returns at most ef_search rows (pgvector default 40),
+                # so never let it cap k; harmless when the index is IVFFlat or absent
+                cur.execute(f"SET LOCAL hnsw.ef_search = {min(max(int(ef_search or 0), int(k)), 1000)}")
+                if probes:
+                    cur.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+                for vec in vecs:
+                    # collection id is interpolated client-side, so the partial index matches
+                    cur.execute(
+                        f"""
+                        SELECT coalesce(custom_id, uuid::text), document, cmetadata - 'source_text'
+                        FROM langchain_pg_embedding
+                        WHERE collection_id = %s
+                        ORDER BY embedding::vector({dim}) <=> %s
+                        LIMIT %s
+                        """,
+                        (self._collection_id, vec, int(k)),
+                    )
+                    results.append([Document(page_content=text or "", metadata={**(md or {}), "id": row_id})
+                                    for row_id, text, md in cur.fetchall()])
+        return results
+
+    def _local_doc(self, r: int) -> Document:
+        row_id, text, md = self.local.row(r)
+        return Document(page_content=text, metadata={**md, "id": row_id})
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        if self.local is not None:
+            return self.local.existing_ids(ids)
+        with pg_connect() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT e.custom_id
+                FROM langchain_pg_embedding e
+                JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                WHERE c.name = %s AND e.custom_id = ANY(%s)
+                """,
+                (settings.COLLECTION, list(ids)),
+            )
+            return {row[0] for row in cur}
 
     def similarity_search(self, query: str, k: int = 10):
-        return self.vstore.similarity_search(query, k=k)
\ No newline at end of file
+        if self.local is not None:
+            return self.dense_search(query, k=k)
+        return self.vstore.similarity_search(query, k=k)
+
+    def get_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings of the given chunk ids, fetched in one query."""
+        if not ids:
+            return {}
+        if self.local is not None:
+            return self.local.get_vectors(ids)
+        with pg_connect() as conn:
+            register_vector(conn)
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT e.custom_id, e.embedding
+                    FROM langchain_pg_embedding e
+                    JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                    WHERE c.name = %s AND e.custom_id = ANY(%s)
+                    """,
+                    (settings.COLLECTION, list(ids)),
+                )
+                return {row_id: np.asarray(vec, dtype=np.float32) for row_id, vec in cur}
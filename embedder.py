@@ -1,9 +1,47 @@
-from typing import List
-from db import VectorDB
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from db import VectorDB, collection_version
+from bm25_index import add_to_index
+from page_store import PageStore
 
 class Embedder:
     def __init__(self):
         self.db = VectorDB()
+        # BM25 manifest label while inside bulk_load(), else None
+        self._version: Optional[str] = None
 
-    def ingest(self, docs: List):
-        self.db.upsert(docs)
\ No newline at end of file
+    @contextmanager
+    def bulk_load(self) -> Iterator[None]:
+        """
+        Wrap several ingest() calls: the ANN index is dropped and rebuilt once
+        (VectorDB.bulk_load), and collection_version() (a digest of every row
+        id) is computed once before and once after instead of per batch.
+        Batches are added to the BM25 index under provisional labels; the
+        real version is written when the load ends cleanly, otherwise the
+        BM25 index is left stale and rebuilt on next use.
+        """
+        if self._version is not None:
+            yield
+            return
+        before = self._version = collection_version()
+        try:
+            with self.db.bulk_load():
+                yield
+            if self._version != before:
+                add_to_index([], [], self._version, collection_version())
+        finally:
+            self._version = None
+
+    def ingest(self, docs: List, pages: Optional[List] = None):
+        with self.bulk_load():
+            if pages:
+                PageStore().upsert(pages)
+            self.db.bulk_upsert(docs)
+            # keep the on-disk BM25 index in step without a full rebuild
+            ids = [d.metadata.get("id") for d in docs]
+            label = f"ingest-{uuid.uuid4().hex}"
+            if all(ids):
+                add_to_index(ids, [d.page_content for d in docs], self._version, label)
+            # else the label matches nothing on disk, so the index stays stale
+            self._version = label
@@ -0,0 +1,63 @@
+# embedding_cache.py
+"""
+Content-addressed embedding cache.
+
+Wraps any LangChain Embeddings object: vectors are stored as float32 blobs
+in SQLite keyed by (deployment, sha256(text)), duplicates inside a batch are
+embedded once, and only cache misses reach the API.
+"""
+import hashlib
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from cache import SQLiteCache
+
+
+def _encode(vec: List[float]) -> bytes:
+    return np.asarray(vec, dtype=np.float32).tobytes()
+
+
+def _decode(blob: bytes) -> List[float]:
+    return np.frombuffer(blob, dtype=np.float32).tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, inner: Embeddings, deployment: str):
+        self.inner = inner
+        self.deployment = deployment
+        self.cache = SQLiteCache("embeddings", encode=_encode, decode=_decode)
+        self.api_calls = 0        # batches actually sent to the API
+        self.api_texts = 0        # texts actually embedded by the API
+
+    def _key(self, text: str) -> str:
+        return f"{self.deployment}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        todo: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in todo:
+                todo[key] = text
+        if todo:
+            vectors = self.inner.embed_documents(list(todo.values()))
+            self.api_calls += 1
+            self.api_texts += len(todo)
+            # round through float32 so fresh and cached vectors are identical
+            fresh = {k: _decode(_encode(v)) for k, v in zip(todo, vectors)}
+            self.cache.set_many(fresh)
+            found.update(fresh)
+        return [list(found[k]) for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vec = self.cache.get(key)
+        if vec is None:
+            vec = _decode(_encode(self.inner.embed_query(text)))
+            self.api_calls += 1
+            self.api_texts += 1
+            self.cache.set(key, vec)
+        return list(vec)
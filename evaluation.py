@@ -1,9 +1,13 @@
 # evaluation.py
 
-"""Retrieval‑ and response‑level evaluation via RagAS."""
+"""
+Retrieval‑ and response‑level evaluation via RagAS, plus local retrieval
+metrics (hit@k, MRR, nDCG@k against the GT chunk id) that need no API calls.
+"""
 import copy
 import json
-from typing import List, Dict
+import math
+from typing import Any, List, Dict, Optional, Sequence
 
 from ragas.metrics import context_precision, answer_relevancy
 from ragas import evaluate
@@ -17,6 +21,8 @@ from ragas.run_config import RunConfig
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 from config import settings
 from llm_wrapper import LLMWrapper
+from cache import SQLiteCache, hash_key
+from embedding_cache import CachedEmbeddings
 
 import tqdm.auto
 from contextlib import contextmanager
@@ -34,8 +40,38 @@ def ragas_tqdm_position(pos: int):
     finally:
         tqdm.auto.tqdm = real_tqdm
 
+# ───────────────────────── local retrieval metrics ──────────────────────────
+RETRIEVAL_METRICS = ("hit", "mrr", "ndcg")
+
+
+def retrieval_metrics(retrieved_ids: Sequence[Optional[str]],
+                      relevant_id: Optional[str],
+                      k: int) -> Dict[str, float]:
+    """
+    hit@k, MRR@k and nDCG@k of one ranked list of chunk ids against the
+    single GT chunk (so the ideal DCG is 1).
+    """
+    ranked = list(retrieved_ids)[:k]
+    if not relevant_id or relevant_id not in ranked:
+        return {"hit": 0.0, "mrr": 0.0, "ndcg": 0.0}
+    rank = ranked.index(relevant_id) + 1
+    return {"hit": 1.0, "mrr": 1.0 / rank, "ndcg": 1.0 / math.log2(rank + 1)}
+
+
+# Record fields each metric actually reads.  Cache keys only cover these, so
+# e.g. context_precision survives any change that leaves retrieval untouched.
+_METRIC_INPUTS = {
+    "context_precision": ("user_input", "retrieved_contexts", "reference"),
+    "answer_relevancy":  ("user_input", "response"),
+}
+
+
 class Evaluator:
-    """Wrap ragas.evaluate() for a list of prediction dicts."""
+    """
+    Wrap ragas.evaluate() for a list of prediction dicts.
+    Per-sample metric values are cached on disk; only cache misses are sent
+    to RagAS, on settings.EVAL_WORKERS concurrent workers.
+    """
 
     def __init__(self):
         # Load the ground‑truth QA set you generated in `build`
@@ -44,6 +80,7 @@ class Evaluator:
         
         self.gt_answer = { item["question"]: item["answer"] for item in gt }
         self.gt_chunk  = { item["question"]: item["chunk_text"] for item in gt }
+        self.gt_chunk_id = { item["question"]: item.get("chunk_id") for item in gt }
 
         # Build an LCEL‑compatible AzureChat LLM
         self.raw_llm = AzureChatOpenAI(
@@ -57,11 +94,14 @@ class Evaluator:
         self.llm = self.raw_llm
 
         # Embeddings for answer_relevancy
-        self.emb = AzureOpenAIEmbeddings(
-            azure_endpoint=settings.OPENAI_ENDPOINT,
-            azure_deployment=settings.EMBEDDING_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            api_version="2024-02-15-preview",
+        self.emb = CachedEmbeddings(
+            AzureOpenAIEmbeddings(
+                azure_endpoint=settings.OPENAI_ENDPOINT,
+                azure_deployment=settings.EMBEDDING_MODEL,
+                api_key=settings.OPENAI_API_KEY,
+                api_version="2024-02-15-preview",
+            ),
+            deployment=settings.EMBEDDING_MODEL,
         )
 
         # Configure the answer_relevancy metric
@@ -69,74 +109,109 @@ class Evaluator:
         self.answer_rel.llm = LangchainLLMWrapper(self.llm)
         self.answer_rel.embeddings = LangchainEmbeddingsWrapper(self.emb)
 
-    def score(self, predictions: List[Dict]) -> Dict[str, float]:
+        self.metrics = [context_precision, self.answer_rel]
+        self.cache = SQLiteCache("ragas_scores")
+
+    def _records(self, predictions: List[Dict]) -> List[Dict[str, Any]]:
+        records = []
+        for p in predictions:
+            q = p["user_input"]
+            records.append({
+                "user_input":         q,
+                "response":           p["prediction"],
+                "reference":          self.gt_answer[q],
+                "retrieved_contexts": p["retrieved_contexts"],
+                "ground_truths":      [self.gt_chunk[q]],
+            })
+        return records
+
+    def _cache_key(self, metric_name: str, record: Dict[str, Any]) -> str:
+        inputs = {f: record[f] for f in _METRIC_INPUTS.get(metric_name, tuple(record))}
+        return hash_key(metric_name, settings.LLM_MODEL, settings.EMBEDDING_MODEL, inputs)
+
+    def _select(self, metrics: Optional[Sequence[str]]) -> List[Any]:
+        """The configured metrics named in `metrics` (all of them for None)."""
+        if metrics is None:
+            return self.metrics
+        chosen = [m for m in self.metrics if m.name in metrics]
+        unknown = set(metrics) - {m.name for m in chosen}
+        if unknown:
+            raise ValueError(f"Unknown RagAS metric(s) {sorted(unknown)} "
+                             f"(expected {[m.name for m in self.metrics]})")
+        return chosen
+
+    def score_samples(self, predictions: List[Dict],
+                      metrics: Optional[Sequence[str]] = None) -> List[Dict[str, float]]:
         """
+        Per-sample values of `metrics` (metric names, default all), one dict
+        per prediction (same order); only the named metrics are judged.
+        NaN marks a sample RagAS could not judge.
         Expects each pred dict to have keys:
           - user_input         (the query string)
           - prediction         (the model's answer)
           - retrieved_contexts (list of raw chunk texts)
         Uses the ground truth map for reference (string).
         """
-        records = []
-        for p in predictions:
-            q = p["user_input"]
-            pred_answer = p["prediction"]
-
-            
-            contexts    = p["retrieved_contexts"]
-            
-            true_ans   = self.gt_answer[q]
-            true_chunk = self.gt_chunk[q]
-            
-            records.append({
-                "user_input":         q,
-                "response":         pred_answer,
-                "reference":          true_ans,          
-                "retrieved_contexts": contexts,
-                "ground_truths":       [true_chunk],  
-            })
-
-        # Build a RagAS EvaluationDataset and run metrics
+        records = self._records(predictions)
+        samples: List[Dict[str, float]] = [{} for _ in records]
+
+        for metric in self._select(metrics):
+            keys = [self._cache_key(metric.name, r) for r in records]
+            cached = self.cache.get_many(keys)
+
+            # identical inputs inside one batch are only evaluated once
+            todo: Dict[str, Dict[str, Any]] = {}
+            for key, rec in zip(keys, records):
+                if key not in cached and key not in todo:
+                    todo[key] = rec
+
+            if todo:
+                with ragas_tqdm_position(2):
+                    eval_result = evaluate(
+                        dataset=EvaluationDataset.from_list(list(todo.values())),
+                        show_progress=True,
+                        llm=LangchainLLMWrapper(self.llm),
+                        embeddings=LangchainEmbeddingsWrapper(self.emb),
+                        metrics=[metric],
+                        raise_exceptions=True,
+                        run_config=RunConfig(max_workers=settings.EVAL_WORKERS),
+                    )
+                fresh = {k: row[metric.name] for k, row in zip(todo, eval_result.scores)}
+                # NaN means RagAS couldn't judge the sample; retry it next time
+                self.cache.set_many({k: v for k, v in fresh.items()
+                                     if isinstance(v, (int, float)) and not math.isnan(v)})
+                cached.update(fresh)
+
+            for sample, key in zip(samples, keys):
+                sample[metric.name] = cached[key]
+
+        return samples
+
+    def retrieval_samples(self, predictions: List[Dict], k: Optional[int] = None) -> List[Dict[str, float]]:
+        """
+        Local retrieval metrics per prediction (see retrieval_metrics): each
+        pred's `retrieved_ids` (ranked chunk ids) against the GT chunk_id of
+        its `user_input`.  Cutoff `k` defaults to settings.RETRIEVAL_METRIC_K.
+        """
+        k = k or settings.RETRIEVAL_METRIC_K
+        return [retrieval_metrics(p["retrieved_ids"], self.gt_chunk_id.get(p["user_input"]), k)
+                for p in predictions]
 
-        eval_dataset = EvaluationDataset.from_list(records)
-        #print(f"DEBUG: Type of eval_dataset: {type(eval_dataset)}")
-        #print(f"DEBUG: One record to see the values - Record: {eval_dataset}")
-        return_scores = None
+    def score(self, predictions: List[Dict], metrics: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """
+        Mean of each of `metrics` (default all) over score_samples(), with
+        unjudged (NaN) samples counted as 0.0; zeros if RagAS fails.
+        """
+        chosen = self._select(metrics)
         try:
-            with ragas_tqdm_position(2):
-                eval_result = evaluate(
-                    dataset=EvaluationDataset.from_list(records),
-                    show_progress=True,
-                    llm=LangchainLLMWrapper(self.llm),
-                    embeddings=LangchainEmbeddingsWrapper(self.emb),
-                    metrics=[
-                        context_precision,   # retrieval metric
-                        self.answer_rel,     # answer quality metric
-                        
-                    ],
-                    raise_exceptions=True,
-                    run_config=RunConfig(max_workers=1)
-                )
-            
-            
-            per_sample = eval_result.scores
-            avg_ctx = sum(r["context_precision"] for r in per_sample) / len(per_sample)
-            avg_rel = sum(r["answer_relevancy" ] for r in per_sample) / len(per_sample)
-            
+            per_sample = self.score_samples(predictions, [m.name for m in chosen])
             return_scores = {
-                "context_precision": avg_ctx,
-                "answer_relevancy":  avg_rel,
+                m.name: sum(0.0 if math.isnan(r[m.name]) else r[m.name] for r in per_sample) / len(per_sample)
+                for m in chosen
             }
-            
-            print(f"DEBUG: Evaluation result : {eval_result.scores} and type of the score {type(eval_result.scores)}")
         except Exception as e:
-            #print(f"Error during evaluation: {e.with_traceback()}")
-            #print(f"DEBUG DEFAUL VALUES: {eval_result}")
-            eval_result = {
-                "context_precision": 0.0,
-                "answer_relevancy": 0.0,
-            }
-            return_scores = eval_result
-       
-        print(f"DEBUG: Final evaluation result: {return_scores} and printing the context_precision {(return_scores.get('context_precision'))} and answer_relevancy {(return_scores.get('answer_relevancy'))}")
-        return return_scores
\ No newline at end of file
+            print(f"DEBUG: Evaluation failed: {e}")
+            return_scores = {m.name: 0.0 for m in chosen}
+
+        print(f"DEBUG: Final evaluation result: {return_scores}")
+        return return_scores
@@ -0,0 +1,226 @@
+# executor.py
+"""
+Stage-wise (column-wise) pipeline execution.
+
+Modules may implement an optional batch protocol next to __call__:
+
+    batch(items: List[tuple], **kwargs) -> List[result]
+
+Each item is the positional-argument tuple of one __call__, and kwargs are
+the keyword arguments shared by the whole batch (`k`, `top_k`).  Results
+come back in item order.  call_batch() uses it when a module has it and
+otherwise falls back to one __call__ per item on a thread pool.
+
+StageExecutor runs a whole question set through NODES one stage at a time,
+so every stage sees its full column of inputs (one embedding request for
+all queries, one llm.batch for all prompts, …).  It also records what each
+stage output cost (its share of the batch's seconds and LLM tokens) next to
+the memo, so usage() can report per-question latency and tokens even for
+reused outputs.
+"""
+import contextvars
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.callbacks import get_openai_callback
+from langchain_community.callbacks.manager import openai_callback_var
+from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+
+from cache import SQLiteCache, hash_key
+from config import settings
+
+# RAG nodes in execution order; each stage consumes the previous one's output
+NODES = ["query_expansion", "retrieval", "augmentation", "reranker", "prompt_maker", "generator"]
+
+# keyword arguments every call of a stage gets
+STAGE_KWARGS: Dict[str, Dict[str, Any]] = {
+    "retrieval": {"k": 10},
+    "reranker":  {"top_k": 5},
+}
+
+MemoKey = Tuple[str, Tuple[int, ...]]
+
+_USAGE_FIELDS = ("total_tokens", "prompt_tokens", "completion_tokens", "successful_requests", "total_cost")
+
+
+@contextmanager
+def token_usage() -> Iterator[OpenAICallbackHandler]:
+    """
+    get_openai_callback() that nests: tokens counted inside are also added
+    to the enclosing counter, which is active again afterwards.
+    """
+    outer = openai_callback_var.get()
+    try:
+        with get_openai_callback() as cb:
+            yield cb
+    finally:
+        openai_callback_var.set(outer)
+    if outer is not None:
+        with outer._lock:
+            for field in _USAGE_FIELDS:
+                setattr(outer, field, getattr(outer, field) + getattr(cb, field))
+
+
+def stage_args(node: str, question: str, out: Dict[str, Any]) -> tuple:
+    """Positional arguments of `node` for one question, given upstream outputs."""
+    if node == "query_expansion":
+        return (question,)
+    if node == "retrieval":
+        return (out["query_expansion"],)
+    if node == "augmentation":
+        return (out["retrieval"],)
+    if node == "reranker":
+        return (question, out["augmentation"])
+    if node == "prompt_maker":
+        return (question, out["reranker"])
+    if node == "generator":
+        return (out["prompt_maker"], out["reranker"])
+    raise ValueError(f"Unknown RAG node '{node}'")
+
+
+def call_batch(mod: Any, items: Sequence[tuple], max_workers: int = 1, **kwargs: Any) -> List[Any]:
+    """Run `mod` over items: its batch() if it has one, else per-item calls."""
+    items = list(items)
+    if not items:
+        return []
+    if callable(getattr(mod, "batch", None)):
+        return list(mod.batch(items, **kwargs))
+    if max_workers <= 1 or len(items) == 1:
+        return [mod(*item, **kwargs) for item in items]
+    # each call runs in a copy of the caller's context, so context-bound
+    # callbacks (e.g. get_openai_callback token counting) see it
+    contexts = [contextvars.copy_context() for _ in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(lambda ctx, item: ctx.run(mod, *item, **kwargs), contexts, items))
+
+
+class StageExecutor:
+    """
+    Runs `pipeline` (node → module) stage by stage over a list of questions.
+    With a shared `memo`, a stage output is reused whenever the question and
+    the modules of that node and every upstream node are unchanged; `costs`
+    (shared alongside it) keeps the (seconds, tokens) each output took.
+    With a `cost_store`, the cost of an output is the one recorded when it
+    was first computed in any run (see _recorded_costs).
+    """
+    def __init__(self,
+                 pipeline: Dict[str, Any],
+                 max_workers: Optional[int] = None,
+                 memo: Optional[Dict[MemoKey, Any]] = None,
+                 costs: Optional[Dict[MemoKey, Tuple[float, float]]] = None,
+                 cost_store: Optional[SQLiteCache] = None):
+        self.pipeline = pipeline
+        self.max_workers = max(1, max_workers or settings.PIPELINE_CONCURRENCY)
+        self.memo: Dict[MemoKey, Any] = {} if memo is None else memo
+        self.costs: Dict[MemoKey, Tuple[float, float]] = {} if costs is None else costs
+        self.cost_store = cost_store
+        self._environment: Optional[str] = None
+        self.memo_hits = 0
+        self.memo_calls = 0
+        # node → wall-clock seconds of that stage, one entry per run()
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+
+    def run(self, questions: Sequence[str], batch_size: Optional[int] = None,
+            until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Per question, the output of every node, in question order.  With
+        `batch_size`, questions go through in chunks of that size (as on the
+        serving path), so recorded latencies are those of a served batch.
+        With `until`, stages after that node are not run.
+        """
+        if batch_size and len(questions) > batch_size:
+            return [out for i in range(0, len(questions), batch_size)
+                    for out in self.run(questions[i:i + batch_size], until=until)]
+        outs: List[Dict[str, Any]] = [{} for _ in questions]
+        prefix: Tuple[int, ...] = ()
+        for node in NODES:
+            mod = self.pipeline[node]
+            prefix += (id(mod),)
+            keys = [(q, prefix) for q in questions]
+
+            # first question for each key not yet computed; duplicates share it
+            todo: Dict[MemoKey, int] = {}
+            for i, key in enumerate(keys):
+                if key not in self.memo and key not in todo:
+                    todo[key] = i
+            self.memo_calls += len(keys)
+            self.memo_hits += len(keys) - len(todo)
+
+            t0 = time.perf_counter()
+            if todo:
+                items = [stage_args(node, questions[i], outs[i]) for i in todo.values()]
+                with token_usage() as cb:
+                    results = call_batch(mod, items, self.max_workers, **STAGE_KWARGS.get(node, {}))
+                self.memo.update(zip(todo, results))
+                # each question is charged its share of the batch's time and tokens
+                cost = ((time.perf_counter() - t0) / len(todo), cb.total_tokens / len(todo))
+                fresh = {key: cost for key in todo}
+                if self.cost_store is not None:
+                    fresh = self._recorded_costs(node, fresh)
+                self.costs.update(fresh)
+            self.timings[node].append(time.perf_counter() - t0)
+            for out, key in zip(outs, keys):
+                out[node] = self.memo[key]
+            if node == until:
+                break
+        return outs
+
+    def _recorded_costs(self, node: str,
+                        fresh: Dict[MemoKey, Tuple[float, float]]) -> Dict[MemoKey, Tuple[float, float]]:
+        """
+        Costs of `node`'s fresh outputs as first recorded in cost_store, keyed
+        by question, the specs of the modules up to `node` and the
+        environment.  Outputs served almost for free by the on-disk caches
+        (embeddings, rerank scores) are charged what they cost when computed,
+        so a cache warmed by an earlier trial doesn't make a module look cheap.
+        """
+        # imported here: pipeline_store imports this module
+        from pipeline_store import environment_digest, module_spec
+
+        if self._environment is None:
+            self._environment = environment_digest()
+        specs = [module_spec(self.pipeline[n]) for n in NODES[:NODES.index(node) + 1]]
+        keys = {key: hash_key("stage-cost", specs, key[0], self._environment) for key in fresh}
+        recorded = self.cost_store.get_many(keys.values())
+        self.cost_store.set_many({k: list(fresh[key]) for key, k in keys.items() if k not in recorded})
+        return {key: tuple(recorded[k]) if k in recorded else fresh[key] for key, k in keys.items()}
+
+    def usage(self, questions: Sequence[str]) -> Dict[str, Any]:
+        """
+        Per-question latency percentiles (ms) per stage and end to end, and
+        mean LLM tokens per question, for the current pipeline on `questions`
+        (which must have been run).  A question's stage latency is its share
+        of its batch's wall time.  Reused outputs count what they cost when
+        first computed.
+        """
+        stages: Dict[str, List[float]] = defaultdict(list)
+        tokens: List[float] = []
+        for question in questions:
+            prefix: Tuple[int, ...] = ()
+            total_s, total_tokens = 0.0, 0.0
+            for node in NODES:
+                prefix += (id(self.pipeline[node]),)
+                seconds, n_tokens = self.costs.get((question, prefix), (0.0, 0.0))
+                stages[node].append(seconds)
+                total_s += seconds
+                total_tokens += n_tokens
+            stages["total"].append(total_s)
+            tokens.append(total_tokens)
+        return {"latency": latency_summary(stages),
+                "tokens_per_question": float(np.mean(tokens)) if tokens else 0.0}
+
+
+def latency_summary(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """p50 / p95 / max in milliseconds per key (stage) of `samples` (seconds)."""
+    summary = {}
+    for key, values in samples.items():
+        ms = np.asarray(values, dtype=np.float64) * 1000
+        if len(ms):
+            summary[key] = {"p50_ms": float(np.percentile(ms, 50)),
+                            "p95_ms": float(np.percentile(ms, 95)),
+                            "max_ms": float(ms.max())}
+    return summary
@@ -1,25 +1,157 @@
 # greedy_search.py
 
-from typing import List, Dict, Any
+import json
+import math
+import multiprocessing
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 from tqdm.auto import tqdm
 
-from evaluation import Evaluator
+import pipeline_store
+from cache import SQLiteCache
+from config import settings
+from db import VectorDB, collection_version
+from evaluation import RETRIEVAL_METRICS, Evaluator
+from executor import NODES, StageExecutor
+from objective import Objective, p95_seconds, print_pareto, tokens_per_question
 from search_space import SEARCH_SPACE
+from trial_store import TrialStore
 from functools import reduce
 from operator import mul
 
+# retrieval-side nodes: with settings.RETRIEVAL_METRIC they are ranked on local
+# retrieval metrics of the contexts the prompt sees (the reranker output)
+LOCAL_METRIC_NODES = ("retrieval", "augmentation", "reranker")
+
+
+def _ragas_records(gt: List[Dict[str, Any]], outs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    RagAS-compatible records for GT entries and their pipeline outputs, plus
+    the ranked chunk ids reaching the prompt (`retrieved_ids`).  Outputs of a
+    run stopped before the generator get an empty prediction.
+    """
+    results: List[Dict[str, Any]] = []
+    for rec, out in zip(gt, outs):
+        question = rec["question"]
+        answer, _ = out.get("generator", ("", None))
+        contexts = out.get("reranker", out["retrieval"])
+
+        # assemble the RagAS-compatible record
+        results.append({
+            "user_input":         question,
+            "prediction":         answer,
+            # wrap reference in list if needed
+            "reference":          rec["answer"] if isinstance(rec["answer"], list)
+                                   else [rec["answer"]],
+            # raw retrieved texts
+            "retrieved_contexts": [d.page_content for d in out["retrieval"]],
+            "retrieved_ids":      [d.metadata.get("id") or getattr(d, "id", None) for d in contexts],
+        })
+    return results
+
+
+def _sample_scores(evaluator: Evaluator, preds: List[Dict[str, Any]]) -> List[float]:
+    """Per-sample context_precision; NaN / failures count as 0.0."""
+    try:
+        samples = evaluator.score_samples(preds, metrics=["context_precision"])
+    except Exception as e:
+        print(f"Error during RAGAS evaluation: {e}. Scoring samples as 0.0")
+        return [0.0] * len(preds)
+    values = []
+    for sample in samples:
+        v = sample.get("context_precision")
+        values.append(float(v) if isinstance(v, (int, float)) and not math.isnan(v) else 0.0)
+    return values
+
+
+# ───────────────────────── trial worker processes ──────────────────────────
+# per-process state: one Evaluator, modules built once per spec, a stage memo
+_WORKER: Dict[str, Any] = {}
+
+
+def _trial_in_worker(specs: Dict[str, Dict[str, Any]],
+                     gt: List[Dict[str, Any]],
+                     max_workers: int) -> Tuple[List[float], Dict[str, Any]]:
+    """
+    Run one trial in a worker process: build the pipeline from module specs
+    (see pipeline_store.module_spec) and return per-sample scores and usage.
+    Workers have their own module instances and API clients; the on-disk
+    caches (embeddings, rerank and RagAS scores) are shared through SQLite.
+    """
+    if not _WORKER:
+        _WORKER.update(evaluator=Evaluator(), modules={}, memo={}, costs={},
+                       cost_store=SQLiteCache("stage_costs"))
+    pipeline = {}
+    for node, spec in specs.items():
+        key = json.dumps(spec, sort_keys=True, default=str)
+        if key not in _WORKER["modules"]:
+            _WORKER["modules"][key] = pipeline_store.build_module(spec)
+        pipeline[node] = _WORKER["modules"][key]
+    executor = StageExecutor(pipeline, max_workers, memo=_WORKER["memo"], costs=_WORKER["costs"],
+                             cost_store=_WORKER["cost_store"])
+    questions = [rec["question"] for rec in gt]
+    outs = executor.run(questions, batch_size=settings.PIPELINE_BATCH_SIZE)
+    return _sample_scores(_WORKER["evaluator"], _ragas_records(gt, outs)), executor.usage(questions)
+
+
 class GreedyAutoRAG:
     """
     Greedy optimisation over each RAG node in SEARCH_SPACE:
     - For each node, try every candidate module in isolation (keeping others fixed)
       and pick the one with the highest context_precision on the ground truth.
+    - Each trial runs the GT stage by stage (executor.StageExecutor), so
+      modules with a batch() see every question at once; the rest run on up
+      to `max_workers` threads (settings.PIPELINE_CONCURRENCY).
+    - With `halving` (settings.GREEDY_HALVING) a node's candidates are first
+      scored on a small stratified GT sample; the bottom HALVING_DROP
+      fraction is dropped and the sample doubled until one candidate is
+      left or the full GT is used.
+    - With `processes` > 1 (settings.TRIAL_PROCESSES) the candidates of a
+      node are evaluated concurrently in spawned worker processes.
+    - With `resume` (settings.TRIAL_CHECKPOINTS) every trial result is
+      checkpointed in a TrialStore; a re-run only evaluates trials whose
+      candidate, pipeline context, GT sample or collection changed.
+    - With settings.RETRIEVAL_METRIC, the LOCAL_METRIC_NODES candidates are
+      first ranked on hit@k / MRR / nDCG@k (stages up to the reranker, no
+      judge); only the best RAGAS_FINALISTS are scored with RagAS.
+    - Trials are ranked by `objective` (objective.Objective): quality minus
+      weighted p95 latency and tokens per question, with optional limits.
+      Every full-GT trial is kept in `trial_log` for the Pareto report.
     """
-    def __init__(self, ground_truth: List[Dict[str, Any]]):
+    def __init__(self, ground_truth: List[Dict[str, Any]], max_workers: Optional[int] = None,
+                 halving: Optional[bool] = None, processes: Optional[int] = None,
+                 resume: Optional[bool] = None, objective: Optional[Objective] = None):
         # ground_truth is a list of dicts: {"question": str, "answer": str}
         self.gt = ground_truth
+        self.max_workers = max(1, max_workers or settings.PIPELINE_CONCURRENCY)
+        self.halving = settings.GREEDY_HALVING if halving is None else halving
+        self.processes = settings.TRIAL_PROCESSES if processes is None else processes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.resume = settings.TRIAL_CHECKPOINTS if resume is None else resume
+        self.trials: Optional[TrialStore] = None
+        # nested stratified samples: every prefix is spread over the whole GT
+        self._sample_order = self._stratified_order(self.gt)
         self.evaluator = Evaluator()
-        # initialize pipeline to first module of each node
-        self.pipeline = { node: modules[0] for node, modules in SEARCH_SPACE.items() }
+        # initialize pipeline to first module of each node (built lazily by the registry)
+        self.pipeline = { node: modules[0].get() for node, modules in SEARCH_SPACE.items() }
+        # best score per node, filled in by optimise()
+        self.scores: Dict[str, float] = {}
+        self.objective = objective or Objective()
+        # pipeline, quality, p95_s, tokens, objective of every distinct full-GT trial
+        self.trial_log: List[Dict[str, Any]] = []
+        self._logged: set = set()
+        # whether GT chunk_ids match stored chunk ids (see _chunk_ids_resolve)
+        self._chunk_ids_ok: Optional[bool] = None
+        # usage (see StageExecutor.usage) of the last _run_pipeline()
+        self.last_usage: Dict[str, Any] = {}
+        # stage outputs keyed by (question, ids of the modules up to that stage),
+        # and the (seconds, tokens) each took
+        self._memo: Dict[Tuple[str, Tuple[int, ...]], Any] = {}
+        self._costs: Dict[Tuple[str, Tuple[int, ...]], Tuple[float, float]] = {}
+        # first-computed cost of every stage output, across runs (see StageExecutor)
+        self._cost_store = SQLiteCache("stage_costs")
 
     def optimise(self) -> Dict[str, Any]:
 
@@ -34,42 +166,40 @@ class GreedyAutoRAG:
 
         print(f"\n🚀 Starting greedy optimisation over {len(SEARCH_SPACE)} nodes…\n")    
 
-        # greedy loop over each node
-        for node_name, candidates in tqdm(SEARCH_SPACE.items(),
-                                          desc="Optimising nodes", 
-                                          position=0, 
-                                          leave=True):
-            
-            print(f"\n🔍 Node '{node_name}' → {len(candidates)} candidate(s) to try")
-            
-            best_score = None
-            best_mod   = self.pipeline[node_name]
-
-            for mod in tqdm(candidates,
-                        desc=f"  Candidates for {node_name}",
-                        leave=False, 
-                        position=1):
+        self._open_trials()
 
-                mod_name = mod.__class__.__name__
-                self.pipeline[node_name] = mod
-                
-                current_cfg = {n: m.__class__.__name__ for n, m in self.pipeline.items()}
-                print(f"  ▶ Trying candidate '{mod_name}'. Pipeline now: {current_cfg}")
+        try:
+            # greedy loop over each node
+            for node_name, candidates in tqdm(SEARCH_SPACE.items(),
+                                              desc="Optimising nodes",
+                                              position=0,
+                                              leave=True):
 
-                
-                preds = self._run_pipeline()
-                score = self._score(preds)
+                print(f"\n🔍 Node '{node_name}' → {len(candidates)} candidate(s) to try")
 
-                print(f"    ↳ Score for '{mod_name}': {score:.4f}")
+                if (settings.RETRIEVAL_METRIC and node_name in LOCAL_METRIC_NODES
+                        and len(candidates) > 1):
+                    best_mod, best_score = self._local_then_ragas(node_name, candidates)
+                elif self.halving and len(candidates) > 1:
+                    best_mod, best_score = self._successive_halving(node_name, candidates)
+                else:
+                    best_mod, best_score = self._full_trials(node_name, candidates)
 
-                if best_score is None or score > best_score:
-                    best_score = score
-                    best_mod   = mod
+                # lock in the best for this node
+                best_name = best_mod.__class__.__name__
+                if best_score == -math.inf:
+                    print(f"⚠️  No candidate for '{node_name}' meets the latency / token limits")
+                print(f"✅ Best for node '{node_name}': '{best_name}' (score={best_score:.4f})\n")
+                self.pipeline[node_name] = best_mod
+                self.scores[node_name] = best_score
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
 
-            # lock in the best for this node
-            best_name = best_mod.__class__.__name__
-            print(f"✅ Best for node '{node_name}': '{best_name}' (score={best_score:.4f})\n")
-            self.pipeline[node_name] = best_mod
+        if self.trials is not None:
+            print(f"💾 Trials: {self.trials.hits} from checkpoint, {self.trials.misses} evaluated")
+        print_pareto(self.trial_log)
 
         final_cfg = {n: m.__class__.__name__ for n, m in self.pipeline.items()}
         print("🎉 Greedy optimisation complete. Final pipeline configuration:")
@@ -79,7 +209,307 @@ class GreedyAutoRAG:
         
         return self.pipeline
 
-    def _run_pipeline(self) -> List[Dict[str, Any]]:
+    def _full_trials(self, node_name: str, candidates: Sequence[Any]) -> Tuple[Any, float]:
+        """Every candidate on the full GT."""
+        if self.processes > 1 and len(candidates) > 1:
+            scores = []
+            for factory, (values, usage) in zip(candidates, self._evaluate(node_name, candidates, self.gt)):
+                quality = statistics.fmean(values) if values else 0.0
+                scores.append(self._log_trial(self._specs(node_name, factory), quality, usage, len(self.gt)))
+                print(f"    ↳ Score for '{factory!r}': {self._describe(scores[-1], quality, usage)}")
+            best = max(range(len(scores)), key=lambda i: (scores[i], -i))   # ties: registry order
+            return candidates[best].get(), scores[best]
+
+        best_score   = None
+        best_factory = None
+
+        for factory in tqdm(candidates,
+                    desc=f"  Candidates for {node_name}",
+                    leave=False, 
+                    position=1):
+
+            specs = self._specs(node_name, factory)
+            key = self._trial_key(specs, self.gt, kind="quality")
+            trial = self.trials.get(key) if key else None
+            if trial is not None:
+                quality, usage = trial["quality"], trial["usage"]
+                score = self._log_trial(specs, quality, usage, len(self.gt))
+                print(f"    ↳ Score for '{factory!r}': {self._describe(score, quality, usage)} (checkpoint)")
+            else:
+                mod = factory.get()
+                mod_name = mod.__class__.__name__
+                self.pipeline[node_name] = mod
+
+                current_cfg = {n: m.__class__.__name__ for n, m in self.pipeline.items()}
+                print(f"  ▶ Trying candidate '{mod_name}'. Pipeline now: {current_cfg}")
+
+                preds = self._run_pipeline()
+                quality, usage = self._score(preds), self.last_usage
+                if key:
+                    self.trials.put(key, {"quality": quality, "usage": usage})
+                score = self._log_trial(specs, quality, usage, len(self.gt))
+
+                print(f"    ↳ Score for '{mod_name}': {self._describe(score, quality, usage)}")
+
+            if best_score is None or score > best_score:
+                best_score   = score
+                best_factory = factory
+        return best_factory.get(), best_score
+
+    # ───────────────────────── local retrieval metrics ──────────────────────────
+    def _local_then_ragas(self, node_name: str, candidates: Sequence[Any]) -> Tuple[Any, float]:
+        """
+        Rank every candidate on the local retrieval metric over the full GT,
+        running the pipeline only up to the reranker; then pick among the
+        best RAGAS_FINALISTS with RagAS (halving or full trials).  A single
+        finalist still gets one full RagAS trial, so the node's score is on
+        the same scale as every other node's.
+        """
+        metric = settings.RETRIEVAL_METRIC
+        if metric not in RETRIEVAL_METRICS:
+            raise ValueError(f"Unknown RETRIEVAL_METRIC '{metric}' (expected one of {RETRIEVAL_METRICS})")
+        label = f"{metric}@{settings.RETRIEVAL_METRIC_K}"
+        if not self._chunk_ids_resolve():
+            return self._ragas_trials(node_name, candidates)
+
+        ranked, qualities = [], []
+        for factory in tqdm(candidates, desc=f"  Candidates for {node_name} ({label})", leave=False, position=1):
+            self.pipeline[node_name] = factory.get()
+            preds = self._run_pipeline(until="reranker")
+            values = [sample[metric] for sample in self.evaluator.retrieval_samples(preds)]
+            quality = statistics.fmean(values) if values else 0.0
+            qualities.append(quality)
+            # usage covers the stages up to the reranker only
+            score = self.objective(quality, self.last_usage)
+            print(f"    ↳ {label} for '{factory!r}': {self._describe(score, quality, self.last_usage)}")
+            ranked.append((score, factory))
+
+        if not any(qualities):
+            # no candidate retrieved a GT chunk: the ranking would just be registry order
+            print(f"⚠️  {label} is 0 for every candidate of '{node_name}'; scoring them with RagAS")
+            return self._ragas_trials(node_name, candidates)
+
+        # stable sort: ties keep registry order
+        ranked.sort(key=lambda r: r[0], reverse=True)
+        finalists = [factory for _, factory in ranked[:max(1, settings.RAGAS_FINALISTS)]]
+        print(f"  🏁 RagAS finalists: {', '.join(repr(f) for f in finalists)}")
+        if len(finalists) == 1:
+            return self._full_trials(node_name, finalists)
+        return self._ragas_trials(node_name, finalists)
+
+    def _ragas_trials(self, node_name: str, candidates: Sequence[Any]) -> Tuple[Any, float]:
+        if self.halving:
+            return self._successive_halving(node_name, candidates)
+        return self._full_trials(node_name, candidates)
+
+    def _chunk_ids_resolve(self) -> bool:
+        """
+        Whether most GT chunk_ids are ids of stored chunks (checked once).
+        Ground truth written before chunks had content-hash ids carries
+        "<source>_<page>" ids that nothing retrieved can match, so every
+        candidate would score 0: warn and let RagAS rank instead.
+        """
+        if self._chunk_ids_ok is None:
+            gt_ids = [rec.get("chunk_id") for rec in self.gt]
+            wanted = sorted({cid for cid in gt_ids if cid})
+            stored = VectorDB().existing_ids(wanted) if wanted else set()
+            resolved = sum(cid in stored for cid in gt_ids)
+            self._chunk_ids_ok = 2 * resolved >= len(gt_ids) > 0
+            if not self._chunk_ids_ok:
+                print(f"⚠️  Only {resolved}/{len(gt_ids)} GT chunk_ids match stored chunks; "
+                      f"ranking retrieval-side nodes with RagAS instead of {settings.RETRIEVAL_METRIC}. "
+                      f"Regenerate the ground truth with `cli.py build --overwrite`.")
+            elif resolved < len(gt_ids):
+                print(f"⚠️  {len(gt_ids) - resolved}/{len(gt_ids)} GT chunk_ids match no stored chunk; "
+                      f"those questions score 0 on {settings.RETRIEVAL_METRIC}")
+        return self._chunk_ids_ok
+
+    # ───────────────────────── successive halving ──────────────────────────
+    @staticmethod
+    def _stratified_order(gt: List[Dict[str, Any]], seed: int = 0) -> List[int]:
+        """
+        GT indices ordered so that every prefix is a stratified sample: GT
+        follows document and chunk order, and the first n indices are spread
+        evenly over it (van der Corput sequence with a random phase).  Each
+        chunk contributes one question before any chunk contributes a second.
+        """
+        groups: Dict[Any, List[int]] = {}
+        for i, rec in enumerate(gt):
+            groups.setdefault(rec.get("chunk_id", i), []).append(i)
+        groups_list = list(groups.values())
+        rng = random.Random(seed)
+        for members in groups_list:
+            rng.shuffle(members)
+
+        def vdc(n: int) -> float:
+            x, denom = 0.0, 1.0
+            while n:
+                denom *= 2
+                n, bit = divmod(n, 2)
+                x += bit / denom
+            return x
+
+        g = len(groups_list)
+        phase = rng.random()
+        seen, group_order = set(), []
+        for n in range(1 << max(g - 1, 0).bit_length()):
+            pos = int(((vdc(n) + phase) % 1.0) * g)
+            if pos not in seen:
+                seen.add(pos)
+                group_order.append(pos)
+        group_order += [pos for pos in range(g) if pos not in seen]
+
+        order = []
+        for depth in range(max((len(m) for m in groups_list), default=0)):
+            order += [groups_list[pos][depth] for pos in group_order if depth < len(groups_list[pos])]
+        return order
+
+    @staticmethod
+    def _mean_ci(values: List[float]) -> Tuple[float, float]:
+        """Mean and 95% confidence half-width (normal approximation)."""
+        mean = statistics.fmean(values)
+        if len(values) < 2:
+            return mean, float("inf")
+        return mean, 1.96 * statistics.stdev(values) / math.sqrt(len(values))
+
+    def _successive_halving(self, node_name: str, candidates: Sequence[Any]) -> Tuple[Any, float]:
+        n = min(max(settings.HALVING_MIN_SAMPLE, 1), len(self.gt))
+        alive = list(candidates)
+        while True:
+            sample = [self.gt[i] for i in self._sample_order[:n]]
+            print(f"  🪜 Rung: {len(alive)} candidate(s) on {n}/{len(self.gt)} GT questions")
+            results = []
+            for factory, (values, usage) in zip(alive, self._evaluate(node_name, alive, sample)):
+                quality, half = self._mean_ci(values)
+                # the latency / token penalty shifts the quality mean; the CI is the quality's
+                score = self._log_trial(self._specs(node_name, factory), quality, usage, n)
+                print(f"    ↳ '{factory!r}': {score:.4f} ± {half:.4f} "
+                      f"(quality {quality:.4f}; {Objective.describe(usage)})")
+                results.append((score, half, factory))
+
+            # stable sort: ties keep registry order
+            results.sort(key=lambda r: r[0], reverse=True)
+            if len(results) == 1 or n >= len(self.gt):
+                break
+            keep = max(1, math.ceil(len(results) * (1 - settings.HALVING_DROP)))
+            for score, half, factory in results[keep:]:
+                print(f"    ✂ Dropping '{factory!r}' ({score:.4f} ± {half:.4f})")
+            if keep == 1:
+                break
+            alive = [factory for _, _, factory in results[:keep]]
+            n = min(2 * n, len(self.gt))
+
+        score, _, winner = results[0]
+        if n < len(self.gt):
+            # a sample score isn't comparable with the full-GT scores of other nodes
+            print(f"  🏁 Re-scoring '{winner!r}' on all {len(self.gt)} GT questions")
+            (values, usage), = self._evaluate(node_name, [winner], self.gt)
+            quality = statistics.fmean(values) if values else 0.0
+            score = self._log_trial(self._specs(node_name, winner), quality, usage, len(self.gt))
+            print(f"    ↳ '{winner!r}': {self._describe(score, quality, usage)}")
+        return winner.get(), score
+
+    # ───────────────────────── trial evaluation ──────────────────────────
+    def _open_trials(self) -> None:
+        if self.resume and self.trials is None:
+            self.trials = TrialStore(collection_version())
+
+    def evaluate_config(self, choice: Dict[str, Any]) -> float:
+        """
+        Score one full pipeline on the whole GT: `choice` maps every node to a
+        search-space factory.  The entry point for other search strategies
+        (see optimisers.py); results are checkpointed like greedy trials.
+        """
+        self._open_trials()
+        specs = {node: f.spec() for node, f in choice.items()}
+        key = self._trial_key(specs, self.gt, kind="quality")
+        trial = self.trials.get(key) if key else None
+        if trial is None:
+            self.pipeline = {node: f.get() for node, f in choice.items()}
+            trial = {"quality": self._score(self._run_pipeline()), "usage": self.last_usage}
+            if key:
+                self.trials.put(key, trial)
+        return self._log_trial(specs, trial["quality"], trial["usage"], len(self.gt))
+
+    def _specs(self, node_name: str, factory: Any) -> Dict[str, Dict[str, Any]]:
+        """Module specs of the pipeline with `factory`'s candidate at `node_name`."""
+        specs = {node: pipeline_store.module_spec(mod)
+                 for node, mod in self.pipeline.items() if node != node_name}
+        specs[node_name] = factory.spec()
+        return specs
+
+    def _trial_key(self, specs: Dict[str, Dict[str, Any]], gt: List[Dict[str, Any]],
+                   kind: str = "per-sample") -> Optional[str]:
+        """Checkpoint key of one trial, None when checkpointing is off."""
+        if self.trials is None:
+            return None
+        return self.trials.key(specs, gt, kind)
+
+    def _log_trial(self, specs: Dict[str, Dict[str, Any]], quality: float,
+                   usage: Dict[str, Any], n_questions: int) -> float:
+        """Objective score of a trial; full-GT trials also go to trial_log."""
+        score = self.objective(quality, usage)
+        key = json.dumps(specs, sort_keys=True, default=str)
+        if n_questions == len(self.gt) and key not in self._logged:
+            self._logged.add(key)
+            self.trial_log.append({
+                "pipeline":  " | ".join(pipeline_store.spec_label(specs[node]) for node in NODES if node in specs),
+                "quality":   quality,
+                "p95_s":     p95_seconds(usage),
+                "tokens":    tokens_per_question(usage),
+                "objective": score,
+            })
+        return score
+
+    def _describe(self, score: float, quality: float, usage: Dict[str, Any]) -> str:
+        broken = self.objective.violations(usage)
+        return (f"{score:.4f} (quality {quality:.4f}; {Objective.describe(usage)})"
+                + (f" ✗ {', '.join(broken)}" if broken else ""))
+
+    def _evaluate(self, node_name: str, factories: Sequence[Any],
+                  gt: List[Dict[str, Any]]) -> List[Tuple[List[float], Dict[str, Any]]]:
+        """Per-sample scores and usage of each candidate for `node_name` on `gt`, checkpointed."""
+        keys = [self._trial_key(self._specs(node_name, factory), gt) for factory in factories]
+        results = [self.trials.get(key) if key else None for key in keys]
+        todo = [i for i, r in enumerate(results) if r is None]
+        if len(todo) < len(factories):
+            print(f"    ↳ {len(factories) - len(todo)}/{len(factories)} trial(s) from checkpoint")
+        if todo:
+            fresh = self._evaluate_uncached(node_name, [factories[i] for i in todo], gt)
+            for i, (values, usage) in zip(todo, fresh):
+                results[i] = {"samples": values, "usage": usage}
+                if keys[i]:
+                    self.trials.put(keys[i], results[i])
+        return [(r["samples"], r["usage"]) for r in results]
+
+    def _evaluate_uncached(self, node_name: str, factories: Sequence[Any],
+                           gt: List[Dict[str, Any]]) -> List[Tuple[List[float], Dict[str, Any]]]:
+        if self.processes > 1 and len(factories) > 1:
+            return self._evaluate_in_pool(node_name, factories, gt)
+        results = []
+        for factory in tqdm(factories, desc=f"  Candidates for {node_name}", leave=False, position=1):
+            self.pipeline[node_name] = factory.get()
+            values = self._score_samples(self._run_pipeline(gt))
+            results.append((values, self.last_usage))
+        return results
+
+    def _evaluate_in_pool(self, node_name: str, factories: Sequence[Any],
+                          gt: List[Dict[str, Any]]) -> List[Tuple[List[float], Dict[str, Any]]]:
+        """
+        One trial per candidate on the worker pool; the other nodes are sent
+        as specs of the modules currently in self.pipeline.
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        futures = [self._pool.submit(_trial_in_worker, self._specs(node_name, factory),
+                                     gt, self.max_workers)
+                   for factory in factories]
+        return [fut.result() for fut in tqdm(futures, desc=f"  Candidates for {node_name} (processes)",
+                                             leave=False, position=1)]
+
+    def _run_pipeline(self, gt: Optional[List[Dict[str, Any]]] = None,
+                      until: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Execute the current pipeline on every ground-truth question,
         collecting the fields RagAS needs:
@@ -87,55 +517,32 @@ class GreedyAutoRAG:
           - prediction
           - reference
           - retrieved_contexts
+        Questions run in PIPELINE_BATCH_SIZE batches, as when serving, and
+        the trial's latency / token usage is left in self.last_usage.  With
+        `until`, stages after that node are skipped.
         """
-        results: List[Dict[str, Any]] = []
-
-        for rec in self.gt:
-            
-            
-            
-            question = rec["question"]
-            # 1. query expansion
-            q2   = self.pipeline["query_expansion"](question)
-            # 2. retrieval
-            docs = self.pipeline["retrieval"](q2, k=10)
-            # record raw texts
-            contexts = [d.page_content for d in docs]
-            # 3. augmentation
-            docs2 = self.pipeline["augmentation"](docs)
-            # 4. reranking
-            docs3 = self.pipeline["reranker"](question, docs2, top_k=5)
-            # 5. prompt
-            prompt = self.pipeline["prompt_maker"](question, docs3)
-            # 6. generation
-            answer, _ = self.pipeline["generator"](prompt, docs3)
-
-            
-
-            # assemble the RagAS-compatible record
-            results.append({
-                "user_input":         question,
-                "prediction":         answer,
-                # wrap reference in list if needed
-                "reference":          rec["answer"] if isinstance(rec["answer"], list)
-                                       else [rec["answer"]],
-                "retrieved_contexts": contexts,
-            })
+        gt = self.gt if gt is None else gt
+        executor = StageExecutor(self.pipeline, self.max_workers, memo=self._memo, costs=self._costs,
+                                 cost_store=self._cost_store)
+        questions = [rec["question"] for rec in gt]
+        outs = executor.run(questions, batch_size=settings.PIPELINE_BATCH_SIZE, until=until)
+        results = _ragas_records(gt, outs)
+        self.last_usage = executor.usage(questions)
 
+        print(f"    ↳ Stage memo: {executor.memo_hits}/{executor.memo_calls} stage outputs reused")
         return results
 
+    def _score_samples(self, preds: List[Dict[str, Any]]) -> List[float]:
+        """Per-sample context_precision; NaN / failures count as 0.0."""
+        return _sample_scores(self.evaluator, preds)
+
     def _score(self, preds: List[Dict[str, Any]]) -> float:
         """
         Evaluate using RagAS on the supplied preds, returning the
         configured metric (context_precision).
         """
-        metrics = self.evaluator.score(preds)
-
-
-        
-
         try:
-            metrics = self.evaluator.score(preds)
+            metrics = self.evaluator.score(preds, metrics=["context_precision"])
             # Check if the key exists and the value is numeric before conversion
             score_value = metrics.get("context_precision")
             if isinstance(score_value, (int, float)):
@@ -21,4 +21,10 @@ class GPTGenerator:
 
     def __call__(self, prompt: str, docs: List[Document]) -> Tuple[str, List[Document]]:
         response = self.llm.invoke(prompt).content.strip()
-        return response, docs          # return contexts too (for evaluation)
\ No newline at end of file
+        return response, docs          # return contexts too (for evaluation)
+
+    def batch(self, items: List[Tuple[str, List[Document]]]) -> List[Tuple[str, List[Document]]]:
+        """One llm.batch for many prompts (see executor.py)."""
+        responses = self.llm.batch([prompt for prompt, _ in items],
+                                   config={"max_concurrency": settings.PIPELINE_CONCURRENCY})
+        return [(r.content.strip(), docs) for r, (_, docs) in zip(responses, items)]
\ No newline at end of file
@@ -2,6 +2,8 @@
 
 from typing import List
 from langchain.schema import Document
+from corpus import get_corpus
+from page_store import PageStore
 
 class NoAugment:
     """Return the retrieved docs unchanged."""
@@ -14,29 +16,45 @@ class NoAugment:
 class PrevNextAugment:
     """
     For each retrieved doc, also include its immediate neighbor(s)
-    in the returned list.  Doesn't rely on any `source_text` array.
+    in the returned list.  Neighbours come from the shared corpus snapshot
+    (adjacent chunks of the same source); docs without a known chunk id fall
+    back to their neighbours in the retrieved list.  Doesn't rely on any
+    `source_text` array.
     """
     name = "prev_next"
 
     def __init__(self, mode: str = "both"):
         assert mode in {"prev", "next", "both"}
         self.mode = mode
+        self._corpus = None
+
+    @property
+    def corpus(self):
+        # loaded on first use; get_corpus() shares one snapshot per process
+        if self._corpus is None:
+            self._corpus = get_corpus()
+        return self._corpus
+
+    def _neighbours(self, docs: List[Document], i: int) -> List[Document]:
+        offsets = []
+        if self.mode in ("prev", "both"):
+            offsets.append(-1)
+        if self.mode in ("next", "both"):
+            offsets.append(1)
+
+        pos = self.corpus.position(docs[i])
+        if pos is not None:
+            return [self.corpus.document(pos + o) for o in offsets
+                    if self.corpus.same_source(pos, pos + o)]
+        return [docs[i + o] for o in offsets if 0 <= i + o < len(docs)]
 
     def __call__(self, docs: List[Document]) -> List[Document]:
         augmented: List[Document] = []
-        n = len(docs)
 
         for i, doc in enumerate(docs):
-            # include the doc itself
+            # include the doc itself, then its neighbour(s)
             augmented.append(doc)
-
-            # include previous if asked and exists
-            if self.mode in ("prev", "both") and i > 0:
-                augmented.append(docs[i - 1])
-
-            # include next if asked and exists
-            if self.mode in ("next", "both") and i < n - 1:
-                augmented.append(docs[i + 1])
+            augmented.extend(self._neighbours(docs, i))
 
         # de-duplicate while preserving order
         seen = set()
@@ -48,4 +66,43 @@ class PrevNextAugment:
                 seen.add(key)
                 uniq.append(d)
 
-        return uniq
\ No newline at end of file
+        return uniq
+
+
+class PageAugment:
+    """
+    Swap each retrieved chunk for the full text of its page (plus `window`
+    pages either side), read from the PageStore.  Chunks of the same page
+    collapse into one doc, which keeps the first chunk's metadata (so its
+    id still counts for the retrieval metrics).  Chunks whose page isn't
+    stored, e.g. ones loaded from an Azure index, are kept as they are.
+    """
+    name = "page"
+
+    def __init__(self, window: int = 0):
+        assert window >= 0
+        self.window = window
+        self._pages = None
+
+    @property
+    def pages(self) -> PageStore:
+        # opened on first use, so building the search space needs no database
+        if self._pages is None:
+            self._pages = PageStore()
+        return self._pages
+
+    def __call__(self, docs: List[Document]) -> List[Document]:
+        out: List[Document] = []
+        seen = set()
+        for doc in docs:
+            texts = (self.pages.surrounding(doc, self.window) if self.window
+                     else [t for t in [self.pages.page_text(doc)] if t])
+            if not texts:
+                out.append(doc)
+                continue
+            key = doc.metadata.get("page_id") or (doc.metadata.get("source"), doc.metadata.get("page"))
+            if key in seen:
+                continue
+            seen.add(key)
+            out.append(Document(page_content="\n\n".join(texts), metadata=dict(doc.metadata)))
+        return out
@@ -3,7 +3,7 @@ Prompt-template builders
 • FStringPrompt         - classic chat prompt, passages in order
 • LongContextPrompt     - duplicates best passage at end to mitigate 'lost in middle'
 """
-from typing import List
+from typing import List, Tuple
 from langchain.schema import Document
 from langchain_openai import AzureChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
@@ -57,11 +57,12 @@ class DynamicPrompt:
             api_key=settings.OPENAI_API_KEY,
         )
 
-    def __call__(self, query: str, docs: List[Document]) -> str:
+    @staticmethod
+    def _meta_prompt(query: str, docs: List[Document]) -> list:
         # 1) assemble the context passages
         context = "\n\n---\n\n".join(d.page_content for d in docs)
         # 2) create a “meta-prompt” asking the model to author an optimized prompt
-        meta_prompt = [
+        return [
             SystemMessage(
                 content=(
                     "You are an expert prompt engineer.  "
@@ -82,9 +83,18 @@ class DynamicPrompt:
                 )
             )
         ]
+
+    def __call__(self, query: str, docs: List[Document]) -> str:
+        meta_prompt = self._meta_prompt(query, docs)
         # 3) call the LLM to generate that prompt
         response = self.llm.generate([meta_prompt])
         # 4) the LLM will return something like:
         #    System: “You are a….”\nUser: “Given the above context…” 
         #    which we just hand back as our “prompt” string
-        return response.generations[0][0].text
\ No newline at end of file
+        return response.generations[0][0].text
+
+    def batch(self, items: List[Tuple[str, List[Document]]]) -> List[str]:
+        """One llm.batch over the meta-prompts of many questions (see executor.py)."""
+        responses = self.llm.batch([self._meta_prompt(query, docs) for query, docs in items],
+                                   config={"max_concurrency": settings.PIPELINE_CONCURRENCY})
+        return [r.content for r in responses]
@@ -14,6 +14,15 @@ class HyDEExpander(QueryExpander):
             temperature=0.3,
             api_key=settings.OPENAI_API_KEY,
         )
+    @staticmethod
+    def _prompt(query: str) -> str:
+        return f"Write a concise answer to: {query}"
+
     def __call__(self, query: str):
-        prompt = f"Write a concise answer to: {query}"
-        return self.llm.invoke(prompt).content.strip()
\ No newline at end of file
+        return self.llm.invoke(self._prompt(query)).content.strip()
+
+    def batch(self, items):
+        """One llm.batch for many queries (see executor.py)."""
+        responses = self.llm.batch([self._prompt(query) for (query,) in items],
+                                   config={"max_concurrency": settings.PIPELINE_CONCURRENCY})
+        return [r.content.strip() for r in responses]
\ No newline at end of file
@@ -1,12 +1,18 @@
 """
-Two rerankers
+Three rerankers
 • PassReranker           – leave order as‑is
-• FlagLLMReranker        – LLM scores relevance; keeps top_k
+• FlagLLMReranker        – LLM scores relevance (pointwise or listwise); keeps top_k
+• EmbeddingSimReranker   – cosine to the query over stored chunk vectors (+ optional BM25); no LLM calls
 """
-from typing import List
+import json
+from typing import List, Optional, Tuple
+
+import numpy as np
 from langchain_openai import AzureChatOpenAI
 from langchain.schema import Document
 from config import settings
+from cache import SQLiteCache, hash_key
+from db import VectorDB
 
 class PassReranker:
     name = "pass"
@@ -18,10 +24,16 @@ class PassReranker:
 class FlagLLMReranker:
     """
     Simple relevance‑scoring with GPT‑3.5 – mimics FlagLLM reranker idea.
+    Passages are scored concurrently (at most `max_concurrency` requests in
+    flight) and scores are cached on disk per (model, prompt, query, passage).
+    With `listwise=True` all passages are scored in a single call.  batch()
+    scores every (query, passage) pair of many questions in one llm.batch.
     """
     name = "flag_llm"
 
-    def __init__(self, temperature: float = 0.0):
+    def __init__(self, temperature: float = 0.0, max_concurrency: int = 8, listwise: bool = False):
+        self.max_concurrency = max_concurrency
+        self.listwise = listwise
         self.llm = AzureChatOpenAI(
             verbose=True,
             azure_endpoint=settings.OPENAI_ENDPOINT,
@@ -34,16 +46,180 @@ class FlagLLMReranker:
             "Score (0‑10) how well this passage answers the query.\n"
             "Query: {query}\nPassage: {passage}\nScore:"
         )
+        self.listwise_tmpl = (
+            "Score (0‑10) how well each passage answers the query.\n"
+            "Query: {query}\n\n{passages}\n\n"
+            "Reply with only a JSON array of {n} numbers, one per passage, in order.\n"
+            "Scores:"
+        )
+        self.cache = SQLiteCache("rerank_scores")
 
-    def _score(self, query: str, passage: str) -> float:
-        prompt = self.prompt_tmpl.format(query=query, passage=passage[:4000])
-        resp = self.llm.invoke(prompt).content.strip()
+    @staticmethod
+    def _parse(resp: str) -> float:
         try:
-            return float(resp)
+            return float(resp.strip())
         except ValueError:
             return 0.0
 
-    def __call__(self, query: str, docs: List[Document], top_k: int = 5) -> List[Document]:
-        scored = [(self._score(query, d.page_content), d) for d in docs]
+    def _key(self, template: str, query: str, passages: List[str]) -> str:
+        return hash_key(settings.LLM_MODEL, template, query, passages)
+
+    def _score(self, query: str, passage: str) -> float:
+        return self._score_pointwise(query, [passage])[0]
+
+    def _score_pointwise(self, query: str, passages: List[str]) -> List[float]:
+        return self._score_pairs([(query, p) for p in passages])
+
+    def _score_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        pairs = [(q, p[:4000]) for q, p in pairs]
+        keys = [self._key(self.prompt_tmpl, q, [p]) for q, p in pairs]
+        cached = self.cache.get_many(keys)
+
+        todo = {k: qp for k, qp in zip(keys, pairs) if k not in cached}
+        if todo:
+            prompts = [self.prompt_tmpl.format(query=q, passage=p) for q, p in todo.values()]
+            responses = self.llm.batch(prompts,
+                                       config={"max_concurrency": self.max_concurrency},
+                                       return_exceptions=True)
+            fresh = {k: self._parse(r.content) for k, r in zip(todo, responses)
+                     if not isinstance(r, Exception)}
+            self.cache.set_many(fresh)
+            cached.update(fresh)
+        # failed requests score 0.0 and are retried next time
+        return [cached.get(k, 0.0) for k in keys]
+
+    @staticmethod
+    def _parse_list(resp: str, n: int) -> Optional[List[float]]:
+        try:
+            scores = [float(x) for x in json.loads(resp.strip())]
+        except (ValueError, TypeError):
+            return None
+        return scores if len(scores) == n else None
+
+    def _score_listwise(self, query: str, passages: List[str]) -> List[float]:
+        return self._score_lists([(query, passages)])[0]
+
+    def _score_lists(self, groups: List[Tuple[str, List[str]]]) -> List[List[float]]:
+        groups = [(q, [p[:4000] for p in ps]) for q, ps in groups]
+        keys = [self._key(self.listwise_tmpl, q, ps) for q, ps in groups]
+        cached = self.cache.get_many(keys)
+
+        todo = {k: g for k, g in zip(keys, groups) if k not in cached}
+        if todo:
+            prompts = []
+            for q, ps in todo.values():
+                numbered = "\n\n".join(f"[{i}] {p}" for i, p in enumerate(ps, start=1))
+                prompts.append(self.listwise_tmpl.format(query=q, passages=numbered, n=len(ps)))
+            responses = self.llm.batch(prompts,
+                                       config={"max_concurrency": self.max_concurrency},
+                                       return_exceptions=True)
+            fresh = {}
+            for k, (_, ps), r in zip(todo, todo.values(), responses):
+                scores = None if isinstance(r, Exception) else self._parse_list(r.content, len(ps))
+                if scores is not None:
+                    fresh[k] = scores
+            self.cache.set_many(fresh)
+            cached.update(fresh)
+
+        # unusable replies: fall back to one call per passage
+        fallback = [(q, p) for k, (q, ps) in zip(keys, groups) if k not in cached for p in ps]
+        pointwise = iter(self._score_pairs(fallback))
+        return [cached[k] if k in cached else [next(pointwise) for _ in ps]
+                for k, (_, ps) in zip(keys, groups)]
+
+    @staticmethod
+    def _top(scores: List[float], docs: List[Document], top_k: int) -> List[Document]:
+        scored = list(zip(scores, docs))
         scored.sort(key=lambda x: x[0], reverse=True)
-        return [d for _, d in scored[:top_k]]
\ No newline at end of file
+        return [d for _, d in scored[:top_k]]
+
+    def __call__(self, query: str, docs: List[Document], top_k: int = 5) -> List[Document]:
+        if not docs:
+            return []
+        return self.batch([(query, docs)], top_k=top_k)[0]
+
+    def batch(self, items: List[Tuple[str, List[Document]]], top_k: int = 5) -> List[List[Document]]:
+        """Rerank many (query, docs) items with one llm.batch (see executor.py)."""
+        if self.listwise:
+            groups = [(q, [d.page_content for d in docs]) for q, docs in items if docs]
+            scores = iter(self._score_lists(groups))
+        else:
+            pairs = [(q, d.page_content) for q, docs in items for d in docs]
+            flat = iter(self._score_pairs(pairs))
+            scores = iter([[next(flat) for _ in docs] for _, docs in items if docs])
+        return [self._top(next(scores), docs, top_k) if docs else [] for _, docs in items]
+
+
+class EmbeddingSimReranker:
+    """
+    Rerank by cosine similarity between the query embedding and the chunk
+    embeddings already stored in PGVector (one batched lookup by chunk id;
+    docs without a stored vector are embedded in one call).  With
+    `bm25_weight` > 0 the min-max normalised cosine is blended with BM25
+    scores from the shared index.  One embedding call per query, no LLM.
+    """
+    name = "embedding_sim"
+
+    def __init__(self, bm25_weight: float = 0.0):
+        self.bm25_weight = bm25_weight
+        self.vdb = VectorDB()
+        self._bm25 = None
+
+    @property
+    def bm25(self):
+        # imported lazily: the pure-cosine variant never touches the corpus
+        if self._bm25 is None:
+            from corpus import get_corpus
+            from bm25_index import get_index
+            corpus = get_corpus()
+            self._bm25 = get_index(corpus, corpus.version)
+        return self._bm25
+
+    @staticmethod
+    def _ids(docs: List[Document]) -> List[Optional[str]]:
+        return [d.metadata.get("id") or getattr(d, "id", None) for d in docs]
+
+    def _doc_vectors(self, docs: List[Document], stored: Optional[dict] = None) -> np.ndarray:
+        ids = self._ids(docs)
+        if stored is None:
+            stored = self.vdb.get_vectors([i for i in ids if i])
+        missing = [j for j, i in enumerate(ids) if i not in stored]
+        fresh = self.vdb.embeddings.embed_documents([docs[j].page_content for j in missing]) if missing else []
+        fresh = dict(zip(missing, fresh))
+        return np.vstack([stored[i] if i in stored else np.asarray(fresh[j], dtype=np.float32)
+                          for j, i in enumerate(ids)])
+
+    @staticmethod
+    def _minmax(x: np.ndarray) -> np.ndarray:
+        span = x.max() - x.min()
+        return (x - x.min()) / span if span > 0 else np.zeros_like(x)
+
+    def scores(self, query: str, docs: List[Document],
+               q: Optional[np.ndarray] = None, stored: Optional[dict] = None) -> np.ndarray:
+        if q is None:
+            q = np.asarray(self.vdb.embeddings.embed_query(query), dtype=np.float32)
+        m = self._doc_vectors(docs, stored)
+        cos = (m @ q) / (np.linalg.norm(m, axis=1) * np.linalg.norm(q) + 1e-12)
+        if not self.bm25_weight:
+            return cos
+        bm25 = self.bm25.score_texts(query, [d.page_content for d in docs])
+        return (1 - self.bm25_weight) * self._minmax(cos) + self.bm25_weight * self._minmax(bm25)
+
+    def __call__(self, query: str, docs: List[Document], top_k: int = 5) -> List[Document]:
+        if not docs:
+            return []
+        order = np.argsort(-self.scores(query, docs), kind="stable")
+        return [docs[i] for i in order[:top_k]]
+
+    def batch(self, items: List[Tuple[str, List[Document]]], top_k: int = 5) -> List[List[Document]]:
+        """One embedding request for all queries, one vector lookup for all docs."""
+        queries = self.vdb.embeddings.embed_documents([q for q, _ in items])
+        stored = self.vdb.get_vectors([i for _, docs in items for i in self._ids(docs) if i])
+        out = []
+        for (query, docs), q in zip(items, queries):
+            if not docs:
+                out.append([])
+                continue
+            order = np.argsort(-self.scores(query, docs, np.asarray(q, dtype=np.float32), stored), kind="stable")
+            out.append([docs[i] for i in order[:top_k]])
+        return out
@@ -5,32 +5,47 @@ Retrieval modules
 • HybridDBSFRetriever     - manual Distribution-Based Score Fusion
 """
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from collections import defaultdict
 
+import numpy as np
 from langchain.schema import Document
 from db import VectorDB
+from corpus import Corpus, get_corpus
+from bm25_index import get_index
 
 
 # ───────────────────────── helpers ──────────────────────────
 class _DenseRetriever:
-    """Vector similarity search via PGVector."""
-    def __init__(self, k: int = 10):
+    """
+    Vector similarity search via PGVector.  `ef_search` (HNSW) and `probes`
+    (IVFFlat) trade recall for latency; None keeps the server defaults.
+    """
+    def __init__(self, k: int = 10, ef_search: int | None = None, probes: int | None = None):
         self.k = k
+        self.ef_search = ef_search
+        self.probes = probes
         self.vdb = VectorDB()
 
     def __call__(self, query: str) -> List[Document]:
-        return self.vdb.vstore.similarity_search(query, k=self.k)
+        return self.vdb.dense_search(query, k=self.k, ef_search=self.ef_search, probes=self.probes)
+
+    def batch(self, items: List[Tuple[str]]) -> List[List[Document]]:
+        """All queries embedded in one request and searched together."""
+        return self.vdb.dense_search_many([query for (query,) in items], k=self.k,
+                                          ef_search=self.ef_search, probes=self.probes)
 
 
 class _BM25Retriever:
-    """In-memory BM25 (LangChain community)."""
-    def __init__(self, docs: List[Document]):
-        from langchain_community.retrievers import BM25Retriever as LC_BM25
-        self.bm25 = LC_BM25.from_documents(docs)
+    """BM25 over the persistent, memory-mapped index in bm25_index.py."""
+    def __init__(self, corpus: Corpus):
+        self.corpus = corpus
+        self.index = get_index(corpus, corpus.version)
 
     def __call__(self, query: str, k: int = 10) -> List[Document]:
-        return self.bm25.invoke(query, k=k)
+        hits = self.index.search(query, k=k)
+        positions = self.corpus.positions(np.asarray([key for key, _ in hits], dtype=np.uint64))
+        return [self.corpus.document(int(p)) for p in positions if p >= 0]
 
 
 # ───────────────────────── concrete classes ──────────────────────────
@@ -39,9 +54,7 @@ class BM25Retriever:
 
     def __init__(self, k: int = 10):
         self.k = k
-        # grab ALL docs once (simple but memory‑heavy for huge corpora)
-        all_docs = VectorDB().vstore.similarity_search(" ", k=100_000)
-        self.sparse = _BM25Retriever(all_docs)
+        self.sparse = _BM25Retriever(get_corpus())
 
     def __call__(self, query: str, k: int | None = None) -> List[Document]:
         return self.sparse(query, k or self.k)
@@ -55,20 +68,28 @@ class HybridDBSFRetriever:
     """
     name = "hybrid_dbsf"
 
-    def __init__(self, alpha: float = 0.7, k: int = 10):
+    def __init__(self, alpha: float = 0.7, k: int = 10,
+                 ef_search: int | None = None, probes: int | None = None):
         self.alpha = alpha
         self.k = k
+        self.ef_search = ef_search
+        self.probes = probes
 
-        all_docs = VectorDB().vstore.similarity_search(" ", k=100_000)
-        self.sparse = _BM25Retriever(all_docs)
-        self.dense  = _DenseRetriever(k=100)              # pull plenty for fusion
+        self.sparse = _BM25Retriever(get_corpus())
+        self.dense  = _DenseRetriever(k=100, ef_search=ef_search, probes=probes)  # pull plenty for fusion
 
     def __call__(self, query: str, k: int | None = None) -> List[Document]:
         k = k or self.k
+        return self._fuse(self.sparse(query, k), self.dense(query), k)
 
-        sparse_docs = self.sparse(query, k)
-        dense_docs  = self.dense(query)
+    def batch(self, items: List[Tuple[str]], k: int | None = None) -> List[List[Document]]:
+        """Dense side batched (one embedding request); BM25 is local per query."""
+        k = k or self.k
+        dense = self.dense.batch(items)
+        return [self._fuse(self.sparse(query, k), dense_docs, k)
+                for (query,), dense_docs in zip(items, dense)]
 
+    def _fuse(self, sparse_docs: List[Document], dense_docs: List[Document], k: int) -> List[Document]:
         scores: Dict[str, float] = defaultdict(float)
         for r, doc in enumerate(sparse_docs, start=1):
             scores[doc.page_content] += self.alpha * (1 / r)
@@ -0,0 +1,90 @@
+# objective.py
+"""
+Latency- and cost-aware trial objective.
+
+Every trial records its quality (the RagAS metric) and usage (see
+StageExecutor.usage): per-question latency percentiles per stage and end to
+end, and LLM tokens per question.  The optimisers maximise
+
+    quality − LATENCY_WEIGHT · p95 seconds − TOKEN_WEIGHT · k tokens per question
+
+and treat trials over MAX_P95_LATENCY_S or MAX_TOKENS_PER_QUESTION as
+infeasible (-inf).  With the defaults (no weights, no limits) the objective is
+the quality alone.  pareto_front() reports the trials no other trial beats
+on quality, p95 latency and tokens at once.
+"""
+import math
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+
+def p95_seconds(usage: Dict[str, Any]) -> float:
+    return usage.get("latency", {}).get("total", {}).get("p95_ms", 0.0) / 1000
+
+
+def tokens_per_question(usage: Dict[str, Any]) -> float:
+    return usage.get("tokens_per_question", 0.0)
+
+
+class Objective:
+    def __init__(self,
+                 latency_weight: Optional[float] = None,
+                 token_weight: Optional[float] = None,
+                 max_p95_s: Optional[float] = None,
+                 max_tokens: Optional[float] = None):
+        self.latency_weight = settings.LATENCY_WEIGHT if latency_weight is None else latency_weight
+        self.token_weight = settings.TOKEN_WEIGHT if token_weight is None else token_weight
+        self.max_p95_s = settings.MAX_P95_LATENCY_S if max_p95_s is None else max_p95_s
+        self.max_tokens = settings.MAX_TOKENS_PER_QUESTION if max_tokens is None else max_tokens
+
+    def violations(self, usage: Dict[str, Any]) -> List[str]:
+        """Constraints the trial breaks, e.g. ["p95 3.10 s > 2.00 s"]."""
+        broken = []
+        if self.max_p95_s and p95_seconds(usage) > self.max_p95_s:
+            broken.append(f"p95 {p95_seconds(usage):.2f} s > {self.max_p95_s:.2f} s")
+        if self.max_tokens and tokens_per_question(usage) > self.max_tokens:
+            broken.append(f"{tokens_per_question(usage):.0f} tokens/q > {self.max_tokens:.0f}")
+        return broken
+
+    def penalty(self, usage: Dict[str, Any]) -> float:
+        return (self.latency_weight * p95_seconds(usage)
+                + self.token_weight * tokens_per_question(usage) / 1000)
+
+    def __call__(self, quality: float, usage: Dict[str, Any]) -> float:
+        if self.violations(usage):
+            return -math.inf
+        return quality - self.penalty(usage)
+
+    @staticmethod
+    def describe(usage: Dict[str, Any]) -> str:
+        return f"p95 {p95_seconds(usage):.2f} s, {tokens_per_question(usage):.0f} tokens/q"
+
+
+# ───────────────────────── Pareto front ──────────────────────────
+def pareto_front(trials: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Trials (dicts with quality, p95_s, tokens) not dominated by another:
+    none is at least as good on all three and strictly better on one.
+    Sorted by quality, best first.
+    """
+    def dominates(a, b):
+        at_least = (a["quality"] >= b["quality"] and a["p95_s"] <= b["p95_s"]
+                    and a["tokens"] <= b["tokens"])
+        better = (a["quality"] > b["quality"] or a["p95_s"] < b["p95_s"]
+                  or a["tokens"] < b["tokens"])
+        return at_least and better
+
+    front = [t for t in trials if not any(dominates(o, t) for o in trials)]
+    return sorted(front, key=lambda t: t["quality"], reverse=True)
+
+
+def print_pareto(trials: List[Dict[str, Any]]) -> None:
+    front = pareto_front(trials)
+    if not front:
+        return
+    print(f"\n📈 Pareto front ({len(front)} of {len(trials)} trials): quality vs p95 latency vs tokens")
+    print(f"{'quality':>9}{'p95 s':>9}{'tok/q':>9}  pipeline")
+    for t in front:
+        print(f"{t['quality']:>9.4f}{t['p95_s']:>9.2f}{t['tokens']:>9.0f}  {t['pipeline']}")
+    print()
@@ -0,0 +1,276 @@
+# optimisers.py
+"""
+Budget-aware search strategies over whole pipelines.
+
+GreedyAutoRAG (greedy_search.py) tunes one node at a time.  The strategies
+here propose complete pipelines (one candidate per node) and score each with
+GreedyAutoRAG.evaluate_config, i.e. the same _run_pipeline / _score path and
+trial checkpoints, until their Budget runs out:
+
+  - TPEOptimiser:    sequential model-based search (Tree-structured Parzen
+                     Estimator over categorical choices)
+  - BanditOptimiser: factored UCB1, every candidate of every node is an arm
+
+A strategy implements suggest() (next config, or None when there is nothing
+left to try) and observe(config, score); Optimiser.optimise() runs the loop.
+"""
+import itertools
+import math
+from abc import ABC, abstractmethod
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from tqdm.auto import tqdm
+
+from config import settings
+from executor import token_usage
+from greedy_search import GreedyAutoRAG
+from objective import print_pareto
+from search_space import SEARCH_SPACE
+
+# candidate index per node, in SEARCH_SPACE order
+Config = Tuple[int, ...]
+
+
+class Budget:
+    """
+    Stop after `trials` evaluations, `tokens` LLM tokens (pipeline + RagAS
+    judge, counted with executor.token_usage) or `seconds` of wall-clock.
+    None / 0 means unlimited.  Checked before each trial, so the trial that
+    crosses a limit still finishes.
+    """
+    def __init__(self, trials: Optional[int] = None, tokens: Optional[int] = None,
+                 seconds: Optional[float] = None):
+        self.trials = trials
+        self.tokens = tokens
+        self.seconds = seconds
+        self.used_trials = 0
+        self.used_tokens = 0
+        self._t0: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls) -> "Budget":
+        return cls(settings.OPTIMISER_TRIALS, settings.OPTIMISER_TOKENS, settings.OPTIMISER_SECONDS)
+
+    def start(self) -> None:
+        self._t0 = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return 0.0 if self._t0 is None else time.monotonic() - self._t0
+
+    def charge(self, tokens: int) -> None:
+        self.used_trials += 1
+        self.used_tokens += tokens
+
+    def exhausted(self) -> bool:
+        return bool((self.trials and self.used_trials >= self.trials)
+                    or (self.tokens and self.used_tokens >= self.tokens)
+                    or (self.seconds and self.elapsed >= self.seconds))
+
+    def __str__(self) -> str:
+        return (f"{self.used_trials}/{self.trials or '∞'} trials, "
+                f"{self.used_tokens:,}/{self.tokens or '∞'} tokens, "
+                f"{self.elapsed:.0f}/{self.seconds or '∞'} s")
+
+
+class Optimiser(ABC):
+    name = "base"
+
+    def __init__(self, search: GreedyAutoRAG, budget: Optional[Budget] = None, seed: int = 0):
+        self.search = search
+        self.budget = budget or Budget.from_settings()
+        self.rng = random.Random(seed)
+        self.nodes = list(SEARCH_SPACE)
+        self.sizes = [len(SEARCH_SPACE[node]) for node in self.nodes]
+        self.history: List[Tuple[Config, float]] = []
+        self.scores: Dict[str, float] = {}
+
+    # ───────────────────────── strategy hooks ──────────────────────────
+    @abstractmethod
+    def suggest(self) -> Optional[Config]:
+        """Next config to evaluate, None when there is nothing left to try."""
+
+    @abstractmethod
+    def observe(self, config: Config, score: float) -> None:
+        """Update the strategy with the score of a config it suggested."""
+
+    # ───────────────────────── helpers ──────────────────────────
+    @property
+    def space_size(self) -> int:
+        return math.prod(self.sizes)
+
+    def _seen(self) -> set:
+        return {config for config, _ in self.history}
+
+    def _random_unseen(self, tries: int = 100) -> Optional[Config]:
+        """A uniformly random config not tried yet, None once every config was tried."""
+        seen = self._seen()
+        if len(seen) >= self.space_size:
+            return None
+        for _ in range(tries):
+            config = tuple(self.rng.randrange(n) for n in self.sizes)
+            if config not in seen:
+                return config
+        unseen = [c for c in itertools.product(*map(range, self.sizes)) if c not in seen]
+        return self.rng.choice(unseen) if unseen else None
+
+    def _describe(self, config: Config) -> Dict[str, str]:
+        return {node: repr(SEARCH_SPACE[node][i]) for node, i in zip(self.nodes, config)}
+
+    # ───────────────────────── search loop ──────────────────────────
+    def optimise(self) -> Dict[str, Any]:
+        print(f"🌐 Full combinatorial space is {self.space_size} pipelines")
+        print(f"\n🚀 Starting {self.name} optimisation ({self.budget})…\n")
+
+        self.budget.start()
+        progress = tqdm(desc=f"{self.name} trials", total=self.budget.trials or None, position=0, leave=True)
+        while not self.budget.exhausted():
+            config = self.suggest()
+            if config is None:
+                print("🏁 Every pipeline in the search space has been tried")
+                break
+            choice = {node: SEARCH_SPACE[node][i] for node, i in zip(self.nodes, config)}
+            with token_usage() as cb:
+                score = self.search.evaluate_config(choice)
+            self.budget.charge(cb.total_tokens)
+            self.history.append((config, score))
+            self.observe(config, score)
+            progress.update(1)
+            print(f"  ▶ Trial {len(self.history)}: {self._describe(config)} "
+                  f"→ {score:.4f} ({cb.total_tokens:,} tokens)")
+        progress.close()
+
+        if not self.history:
+            raise RuntimeError("Optimiser budget allows no trials")
+        # ties: earliest trial
+        best_config, best_score = max(self.history, key=lambda h: h[1])
+        self.search.pipeline = {node: SEARCH_SPACE[node][i].get() for node, i in zip(self.nodes, best_config)}
+        self.scores = {"pipeline": best_score}
+
+        print_pareto(self.search.trial_log)
+        print(f"🎉 {self.name} optimisation complete ({self.budget}). "
+              f"Best score {best_score:.4f} with:")
+        for node, candidate in self._describe(best_config).items():
+            print(f"   • {node}: {candidate}")
+        print()
+        return self.search.pipeline
+
+
+class TPEOptimiser(Optimiser):
+    """
+    Tree-structured Parzen Estimator for categorical choices.  After
+    `n_startup` random trials the history is split at the `gamma` quantile
+    into good and bad pipelines; every node gets smoothed categorical
+    densities l(x) (good) and g(x) (bad).  `n_candidates` configs are drawn
+    from l and the untried one maximising l(x)/g(x) is evaluated next.
+    """
+    name = "tpe"
+
+    def __init__(self, search: GreedyAutoRAG, budget: Optional[Budget] = None, seed: int = 0,
+                 n_startup: int = 5, gamma: float = 0.25, n_candidates: int = 24,
+                 prior_weight: float = 1.0):
+        super().__init__(search, budget, seed)
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.prior_weight = prior_weight
+
+    def _density(self, configs: List[Config], j: int) -> List[float]:
+        counts = [self.prior_weight] * self.sizes[j]
+        for config in configs:
+            counts[config[j]] += 1
+        total = sum(counts)
+        return [c / total for c in counts]
+
+    def suggest(self) -> Optional[Config]:
+        if len(self.history) < self.n_startup:
+            return self._random_unseen()
+
+        ranked = sorted(self.history, key=lambda h: h[1], reverse=True)
+        n_good = max(1, math.ceil(self.gamma * len(ranked)))
+        good = [config for config, _ in ranked[:n_good]]
+        bad = [config for config, _ in ranked[n_good:]]
+        l = [self._density(good, j) for j in range(len(self.sizes))]
+        g = [self._density(bad, j) for j in range(len(self.sizes))]
+
+        seen = self._seen()
+        best, best_ratio = None, -math.inf
+        for _ in range(self.n_candidates):
+            config = tuple(self.rng.choices(range(n), weights=l[j])[0] for j, n in enumerate(self.sizes))
+            if config in seen:
+                continue
+            ratio = sum(math.log(l[j][x]) - math.log(g[j][x]) for j, x in enumerate(config))
+            if ratio > best_ratio:
+                best, best_ratio = config, ratio
+        return best if best is not None else self._random_unseen()
+
+    def observe(self, config: Config, score: float) -> None:
+        pass                               # suggest() re-reads self.history
+
+
+class BanditOptimiser(Optimiser):
+    """
+    Factored UCB1 bandit: every candidate of every node is an arm whose
+    reward is the mean score of the trials that used it (infeasible trials,
+    see objective.py, count as 0).  Each trial pulls,
+    per node, the arm with the highest upper confidence bound (untried arms
+    first).  If that pipeline was already scored, the single-node switch
+    that gives up the least UCB is tried instead.
+    """
+    name = "bandit"
+
+    def __init__(self, search: GreedyAutoRAG, budget: Optional[Budget] = None, seed: int = 0,
+                 c: float = math.sqrt(2)):
+        super().__init__(search, budget, seed)
+        self.c = c
+        self.pulls = [[0] * n for n in self.sizes]
+        self.rewards = [[0.0] * n for n in self.sizes]
+
+    def observe(self, config: Config, score: float) -> None:
+        reward = score if math.isfinite(score) else 0.0
+        for j, x in enumerate(config):
+            self.pulls[j][x] += 1
+            self.rewards[j][x] += reward
+
+    def _ucb(self, j: int) -> List[float]:
+        log_t = math.log(max(2, len(self.history)))
+        return [math.inf if n == 0 else r / n + self.c * math.sqrt(log_t / n)
+                for r, n in zip(self.rewards[j], self.pulls[j])]
+
+    def suggest(self) -> Optional[Config]:
+        ucb = [self._ucb(j) for j in range(len(self.sizes))]
+        # random tie-break, so untried arms are not always taken in registry order
+        ranked = [sorted(range(n), key=lambda x: (ucb[j][x], self.rng.random()), reverse=True)
+                  for j, n in enumerate(self.sizes)]
+        config = tuple(r[0] for r in ranked)
+        seen = self._seen()
+        if config not in seen:
+            return config
+
+        switches = sorted((ucb[j][r[0]] - ucb[j][alt], j, alt)
+                          for j, r in enumerate(ranked) for alt in r[1:])
+        for _, j, alt in switches:
+            candidate = config[:j] + (alt,) + config[j + 1:]
+            if candidate not in seen:
+                return candidate
+        return self._random_unseen()
+
+
+OPTIMISERS = {"tpe": TPEOptimiser, "bandit": BanditOptimiser}
+
+
+def make_optimiser(ground_truth: List[Dict[str, Any]], name: Optional[str] = None,
+                   budget: Optional[Budget] = None) -> Any:
+    """
+    The search for settings.OPTIMISER: GreedyAutoRAG itself for "greedy",
+    else the named strategy around it.  Both expose optimise() and scores.
+    """
+    name = (name or settings.OPTIMISER).lower()
+    search = GreedyAutoRAG(ground_truth)
+    if name == "greedy":
+        return search
+    if name not in OPTIMISERS:
+        raise ValueError(f"Unknown optimiser '{name}' (expected greedy, {', '.join(OPTIMISERS)})")
+    return OPTIMISERS[name](search, budget)
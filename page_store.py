@@ -0,0 +1,129 @@
+# page_store.py
+"""
+Page-level text store.
+
+Chunks only carry a `page_id` in their metadata; the full page text lives
+once per page next to the vectors and is fetched lazily (and LRU-cached) by
+whoever needs the surrounding text.  settings.VECTOR_BACKEND picks where:
+the `autorag_pages` table next to PGVector ("pgvector"), or a SQLite file
+NUMPY_STORE_DIR/pages.sqlite ("numpy"), so the NumPy backend never needs
+Postgres.
+"""
+import hashlib
+import pathlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from psycopg2.extras import execute_values
+from langchain.schema import Document
+
+from config import settings
+from db import pg_connect
+
+
+def page_id(source: str, page: Optional[int]) -> str:
+    """Stable id of one page of one source document."""
+    return hashlib.sha256(f"{source}\x00{page}".encode("utf-8")).hexdigest()[:32]
+
+
+class PageStore:
+    TABLE = "autorag_pages"
+
+    def __init__(self, cache_size: int = 256):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()     # modules are called from several threads
+        ddl = f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                page_id TEXT PRIMARY KEY,
+                source  TEXT,
+                page    INT,
+                text    TEXT
+            )
+            """
+        self.path: Optional[pathlib.Path] = None
+        if settings.VECTOR_BACKEND == "numpy":
+            self.path = pathlib.Path(settings.NUMPY_STORE_DIR) / "pages.sqlite"
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._local = threading.local()
+            with self._sqlite() as conn:
+                conn.execute(ddl)
+            return
+        with pg_connect() as conn, conn.cursor() as cur:
+            cur.execute(ddl)
+
+    def _sqlite(self) -> sqlite3.Connection:
+        # sqlite connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, pages: Iterable[Document]) -> None:
+        """Store page Documents (metadata: page_id, source, page)."""
+        rows = [(p.metadata["page_id"], p.metadata.get("source"), p.metadata.get("page"), p.page_content)
+                for p in pages]
+        if not rows:
+            return
+        if self.path is not None:
+            with self._sqlite() as conn:
+                conn.executemany(f"INSERT OR REPLACE INTO {self.TABLE} VALUES (?, ?, ?, ?)", rows)
+            return
+        with pg_connect() as conn, conn.cursor() as cur:
+            execute_values(
+                cur,
+                f"""
+                INSERT INTO {self.TABLE} (page_id, source, page, text) VALUES %s
+                ON CONFLICT (page_id) DO UPDATE SET text = EXCLUDED.text
+                """,
+                rows,
+            )
+
+    def get_many(self, ids: List[str]) -> Dict[str, str]:
+        with self._cache_lock:
+            found = {i: self._cache[i] for i in ids if i in self._cache}
+        missing = [i for i in dict.fromkeys(ids) if i not in found]
+        if missing and self.path is not None:
+            conn = self._sqlite()
+            for i in range(0, len(missing), 500):      # stay under SQLite's variable limit
+                batch = missing[i:i + 500]
+                found.update(conn.execute(
+                    f"SELECT page_id, text FROM {self.TABLE} WHERE page_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ))
+        elif missing:
+            with pg_connect() as conn, conn.cursor() as cur:
+                cur.execute(f"SELECT page_id, text FROM {self.TABLE} WHERE page_id = ANY(%s)", (missing,))
+                found.update(dict(cur.fetchall()))
+        with self._cache_lock:
+            for i in ids:
+                if i in found:
+                    self._cache[i] = found[i]
+                    self._cache.move_to_end(i)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
+
+    def get(self, pid: str) -> Optional[str]:
+        return self.get_many([pid]).get(pid)
+
+    def page_text(self, doc: Document) -> Optional[str]:
+        """Full text of the page a chunk came from."""
+        pid = doc.metadata.get("page_id")
+        if pid is None and "source" in doc.metadata:
+            pid = page_id(doc.metadata["source"], doc.metadata.get("page"))
+        return self.get(pid) if pid else None
+
+    def surrounding(self, doc: Document, window: int = 1) -> List[str]:
+        """Texts of the chunk's page and up to `window` pages either side."""
+        source, page = doc.metadata.get("source"), doc.metadata.get("page")
+        if source is None or page is None:
+            text = self.page_text(doc)
+            return [text] if text else []
+        ids = [page_id(source, p) for p in range(max(page - window, 0), page + window + 1)]
+        found = self.get_many(ids)
+        return [found[i] for i in ids if i in found]
@@ -2,27 +2,49 @@
 """Load a PDF and split it into overlapping chunks."""
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
 from config import settings
-from typing import List
+from page_store import page_id
+from typing import Dict, List
+import hashlib
+
+
+def chunk_id(source: str, text: str, occurrence: int = 0) -> str:
+    """
+    Content-addressed chunk id: a chunk keeps its id wherever it moves in the
+    document.  `occurrence` (earlier chunks of the source with the same text)
+    only tells identical chunks apart.
+    """
+    raw = f"{source}\x00{text}\x00{occurrence}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
 
 
 class PDFChunker:
     def __init__(self, pdf_path: str):
         self.pdf_path = pdf_path              # <- keep for metadata
+        self.pages: List[Document] = []
         self.loader = PyPDFLoader(pdf_path)
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=settings.CHUNK_SIZE,
             chunk_overlap=settings.CHUNK_OVERLAP,
         )
 
+    def load_pages(self) -> List[Document]:
+        """Page-level docs, each tagged with its page_id (see page_store)."""
+        pages = self.loader.load()
+        for page in pages:
+            page.metadata["source"] = self.pdf_path
+            page.metadata["page_id"] = page_id(self.pdf_path, page.metadata.get("page"))
+        return pages
+
     def load_chunks(self):
-        pages = self.loader.load()                    # page‑level docs
-        
-        page_texts: List[str] = [page.page_content for page in pages]
+        # keep the pages so the caller can hand them to the PageStore
+        self.pages = self.load_pages()                # page‑level docs
 
-        docs = self.splitter.split_documents(pages)   # chunk‑level docs
+        docs = self.splitter.split_documents(self.pages)   # chunk‑level docs
 
-        for chunk in docs:
+        seen: Dict[str, int] = {}
+        for chunk_index, chunk in enumerate(docs):
             md = chunk.metadata
             # If PyPDFLoader gave you a page number, reuse it;
             # otherwise you may need to parse md['loc'] or similar—but typically
@@ -34,5 +56,10 @@ class PDFChunker:
 
             md["source"] = self.pdf_path
             md["page"] = page_idx
-            md["source_text"] = page_texts
-        return docs
\ No newline at end of file
+            # page text is stored once in the PageStore, not copied into every chunk
+            md["page_id"] = page_id(self.pdf_path, page_idx)
+            md["chunk_index"] = chunk_index
+            occurrence = seen.get(chunk.page_content, 0)
+            seen[chunk.page_content] = occurrence + 1
+            md["id"] = chunk_id(self.pdf_path, chunk.page_content, occurrence)
+        return docs
@@ -0,0 +1,148 @@
+# pipeline_store.py
+"""
+Persist the optimised pipeline so `ask` can skip greedy search.
+
+The artifact records, per RAG node, which module won (import path + constructor
+params) together with the scores and a fingerprint of everything the result
+depends on: ground_truth.json, the PGVector collection, the search-space
+source files and the environment every trial runs in (models, vector
+backend, stage kwargs, executor and evaluation sources).  If any of those
+change, `load()` returns None and the caller re-optimises.
+"""
+import hashlib
+import importlib
+import inspect
+import json
+import pathlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from config import settings
+from db import collection_version
+from executor import STAGE_KWARGS
+
+ARTIFACT_VERSION = 1
+
+_ROOT = pathlib.Path(__file__).parent
+
+# settings every trial's scores depend on, whichever candidates are picked
+_ENV_SETTINGS = ("LLM_MODEL", "EMBEDDING_MODEL", "EMBEDDING_DIM", "VECTOR_BACKEND",
+                 "VECTOR_QUANTIZATION", "VECTOR_RESCORE_FACTOR")
+# code every trial runs through: stage execution and scoring
+_ENV_SOURCES = ("executor.py", "evaluation.py")
+
+
+def _sha256_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _search_space_digest() -> str:
+    """Hash search_space.py and every module source it can pick candidates from."""
+    h = hashlib.sha256()
+    files = [_ROOT / "search_space.py", *sorted((_ROOT / "modules").rglob("*.py"))]
+    for path in files:
+        h.update(str(path.relative_to(_ROOT)).encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def environment_digest() -> str:
+    """Hash the _ENV_SETTINGS values, STAGE_KWARGS and the _ENV_SOURCES files."""
+    h = hashlib.sha256()
+    env = {name: getattr(settings, name) for name in _ENV_SETTINGS}
+    h.update(json.dumps([env, STAGE_KWARGS], sort_keys=True, default=str).encode())
+    for name in _ENV_SOURCES:
+        h.update(name.encode())
+        h.update((_ROOT / name).read_bytes())
+    return h.hexdigest()
+
+
+def fingerprint(gt_path: str = "ground_truth.json") -> Dict[str, str]:
+    """Everything an optimisation result depends on."""
+    return {
+        "ground_truth": _sha256_file(pathlib.Path(gt_path)),
+        "collection":   f"{settings.COLLECTION}:{collection_version()}",
+        "search_space": _search_space_digest(),
+        "environment":  environment_digest(),
+    }
+
+
+# ───────────────────────── module (de)serialisation ──────────────────────────
+def module_spec(mod: Any) -> Dict[str, Any]:
+    """
+    Describe a module instance by import path and constructor params.
+    Params are read back from same-named attributes, falling back to the
+    signature default when the module doesn't keep them.
+    """
+    cls = type(mod)
+    params = {}
+    for name, p in inspect.signature(cls.__init__).parameters.items():
+        if name == "self" or p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD):
+            continue
+        value = getattr(mod, name, p.default)
+        if value is inspect.Parameter.empty:
+            continue
+        params[name] = value
+    return {"module": cls.__module__, "class": cls.__qualname__, "params": params}
+
+
+def spec_label(spec: Dict[str, Any]) -> str:
+    """Class name plus the params that differ from its signature defaults."""
+    try:
+        cls = getattr(importlib.import_module(spec["module"]), spec["class"])
+        defaults = {name: p.default for name, p in inspect.signature(cls.__init__).parameters.items()}
+    except (ImportError, AttributeError, TypeError, ValueError):
+        defaults = {}
+    args = ", ".join(f"{k}={v!r}" for k, v in spec.get("params", {}).items()
+                     if k not in defaults or defaults[k] != v)
+    return f"{spec['class']}({args})" if args else spec["class"]
+
+
+def build_module(spec: Dict[str, Any]) -> Any:
+    cls = getattr(importlib.import_module(spec["module"]), spec["class"])
+    return cls(**spec.get("params", {}))
+
+
+# ───────────────────────── artifact I/O ──────────────────────────
+def save(pipeline: Dict[str, Any],
+         scores: Dict[str, float],
+         fp: Dict[str, str],
+         path: str = None) -> pathlib.Path:
+    out_path = pathlib.Path(path or settings.PIPELINE_ARTIFACT)
+    artifact = {
+        "version":     ARTIFACT_VERSION,
+        "created":     datetime.now(timezone.utc).isoformat(),
+        "fingerprint": fp,
+        "nodes":       {node: module_spec(mod) for node, mod in pipeline.items()},
+        "scores":      scores,
+    }
+    with out_path.open("w") as f:
+        json.dump(artifact, f, indent=2)
+    print(f"💾 Optimised pipeline saved to {out_path.resolve()}")
+    return out_path
+
+
+def load(fp: Dict[str, str], path: str = None) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild the saved pipeline, or return None when there is no artifact
+    or it is stale (different version or fingerprint).
+    """
+    in_path = pathlib.Path(path or settings.PIPELINE_ARTIFACT)
+    if not in_path.exists():
+        return None
+    with in_path.open() as f:
+        artifact = json.load(f)
+
+    if artifact.get("version") != ARTIFACT_VERSION:
+        print(f"♻️  {in_path} has artifact version {artifact.get('version')}, expected {ARTIFACT_VERSION}.")
+        return None
+    stale = [k for k, v in fp.items() if artifact.get("fingerprint", {}).get(k) != v]
+    if stale:
+        print(f"♻️  {in_path} is stale ({', '.join(stale)} changed).")
+        return None
+
+    return {node: build_module(spec) for node, spec in artifact["nodes"].items()}
@@ -3,7 +3,8 @@ Generate ground-truth Q-A pairs per chunk.
 """
 import json
 import pathlib
-from typing import List, Dict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List
 
 from langchain_openai import AzureChatOpenAI
 from langchain.prompts import PromptTemplate
@@ -56,26 +57,117 @@ class QAGenerator:
         cleaned = self._clean_json(resp)
         return json.loads(cleaned)
 
-    def build_ground_truth(self, docs: List) -> List[Dict]:
+    def _qa_with_retry(self, chunk_text: str) -> List[Dict]:
         """
-        For each Document in `docs`, generate self.k Q-A pairs,
-        write out ground_truth.json, and return the list.
+        qa_pairs() with retries for unparsable or malformed replies.
+        Raises the last error once settings.QA_RETRIES attempts are used up.
         """
-        out_path = pathlib.Path("ground_truth.json")
-        gt: List[Dict] = []
-
-        print(f"DEBUG: QAGenerator - receiving total of {len(docs)} chunks")
-
-        for d in tqdm(docs, desc="Chunks processed", unit="chunk"):
-            for qa in self.qa_pairs(d.page_content, self.k):
-                qa["chunk_id"]   = d.metadata.get("source", "") + f"_{d.metadata.get('page')}"
-                qa["chunk_text"] = d.page_content
-                qa["question"]   = qa["question"].strip()
-                qa["answer"]     = qa["answer"].strip()
-                gt.append(qa)
-
+        last_err: Exception = ValueError("no attempts made")
+        for _ in range(max(1, settings.QA_RETRIES)):
+            try:
+                pairs = self.qa_pairs(chunk_text, self.k)
+                if not isinstance(pairs, list):
+                    raise ValueError(f"expected a JSON list, got {type(pairs).__name__}")
+                pairs = [qa for qa in pairs
+                         if isinstance(qa, dict) and qa.get("question") and qa.get("answer")]
+                if not pairs:
+                    raise ValueError("reply contained no usable Q-A pairs")
+                return pairs
+            except Exception as e:
+                last_err = e
+        raise last_err
+
+    @staticmethod
+    def _chunk_id(d) -> str:
+        # stable per-chunk id from the loader, else the legacy source_page form
+        md = d.metadata
+        return md.get("id") or md.get("chunk_id") or md.get("source", "") + f"_{md.get('page')}"
+
+    @staticmethod
+    def _load_checkpoint(path: pathlib.Path) -> Dict[str, List[Dict]]:
+        done: Dict[str, List[Dict]] = {}
+        if not path.exists():
+            return done
+        with path.open() as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue                      # torn last line from a crash
+                if "qa" in rec:
+                    done[rec["chunk_id"]] = rec["qa"]
+        return done
+
+    def build_ground_truth(self, docs: Iterable, out_path: str = "ground_truth.json") -> List[Dict]:
+        """
+        For each Document in `docs` (any iterable, e.g. a streaming loader),
+        generate self.k Q-A pairs on settings.QA_WORKERS threads, write out
+        ground_truth.json, and return the list.
+
+        Every finished chunk is appended to <out>.partial.jsonl straight away;
+        a re-run skips chunk ids already recorded there, so a crash only loses
+        in-flight chunks.  Chunks whose replies stay unparsable after retries
+        are left out of ground_truth.json and the checkpoint is kept, so the
+        next build (AutoRAGPipeline.build_from_*) resumes and retries them.
+        """
+        out_path = pathlib.Path(out_path)
+        ckpt_path = out_path.with_suffix(".partial.jsonl")
+        done = self._load_checkpoint(ckpt_path)
+        if done:
+            print(f"↩️  Resuming: {len(done)} chunk(s) already in {ckpt_path}")
+
+        order: List[str] = []                 # chunk ids in input order
+        skipped = 0
+        workers = max(1, settings.QA_WORKERS)
+        total = len(docs) if hasattr(docs, "__len__") else None
+
+        with ckpt_path.open("a") as ckpt, ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight: Dict[Future, tuple] = {}
+            bar = tqdm(total=total, desc="Chunks processed", unit="chunk")
+
+            def drain(block_until: int) -> None:
+                # write finished chunks until at most `block_until` remain in flight
+                nonlocal skipped
+                while len(in_flight) > block_until:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        cid, d = in_flight.pop(fut)
+                        try:
+                            pairs = fut.result()
+                        except Exception as e:
+                            skipped += 1
+                            ckpt.write(json.dumps({"chunk_id": cid, "error": str(e)}) + "\n")
+                        else:
+                            for qa in pairs:
+                                qa["chunk_id"]   = cid
+                                qa["chunk_text"] = d.page_content
+                                qa["question"]   = str(qa["question"]).strip()
+                                qa["answer"]     = str(qa["answer"]).strip()
+                            done[cid] = pairs
+                            ckpt.write(json.dumps({"chunk_id": cid, "qa": pairs}) + "\n")
+                        ckpt.flush()
+                        bar.update(1)
+
+            for d in docs:
+                cid = self._chunk_id(d)
+                order.append(cid)
+                if cid in done:
+                    bar.update(1)
+                    continue
+                in_flight[pool.submit(self._qa_with_retry, d.page_content)] = (cid, d)
+                drain(block_until=2 * workers)     # bounded look-ahead on streamed input
+            drain(block_until=0)
+            bar.close()
+
+        print(f"DEBUG: QAGenerator - processed {len(order)} chunks, {skipped} skipped")
+
+        gt: List[Dict] = [qa for cid in dict.fromkeys(order) for qa in done.get(cid, [])]
         with out_path.open("w") as f:
             json.dump(gt, f, indent=2)
         print(f"📝 Ground-truth saved to {out_path.resolve()}")
+        if skipped:
+            print(f"⚠️  {skipped} chunk(s) without QA pairs; re-run the build to retry them")
+        else:
+            ckpt_path.unlink(missing_ok=True)
 
-        return gt
\ No newline at end of file
+        return gt
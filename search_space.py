@@ -1,43 +1,140 @@
+"""
+Search-space registry.
+
+Each RAG node lists ModuleFactory entries (class + constructor params).
+Nothing is instantiated on import: a factory builds its module the first
+time a trial or the serving path calls `.get()` and caches the instance.
+Query expanders are discovered from modules/query_expansion; rescanning
+only imports new or modified files, so unchanged expanders keep their
+cached instances.
+"""
 from modules.retrieval import BM25Retriever, HybridDBSFRetriever
-from modules.passage_augmentation import NoAugment, PrevNextAugment
-from modules.reranker import PassReranker, FlagLLMReranker
+from modules.passage_augmentation import NoAugment, PrevNextAugment, PageAugment
+from modules.reranker import PassReranker, FlagLLMReranker, EmbeddingSimReranker
 from modules.prompt_maker import FStringPrompt, LongContextPrompt, DynamicPrompt
 from modules.generator import GPTGenerator
 
 import pkgutil
 import importlib
-from typing import List
+import inspect
+import pathlib
+import threading
+from typing import Any, Dict, List, Tuple
 from modules.query_expansion.base import QueryExpander
 
-def _discover_query_expanders() -> List[QueryExpander]:
-    pkg_path = "modules/query_expansion".replace("/", ".")
-    expanders = []
-    for finder, module_name, ispkg in pkgutil.iter_modules([ "modules/query_expansion" ]):
-        module = importlib.import_module(f"{pkg_path}.{module_name}")
-        for obj in vars(module).values():
+
+class ModuleFactory:
+    """Lazily-built search-space candidate: node, class and constructor params."""
+
+    def __init__(self, node: str, cls: type, **params: Any):
+        self.node = node
+        self.cls = cls
+        self.params = params
+        self.name = getattr(cls, "name", None) or cls.__name__
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def cls_name(self) -> str:
+        return self.cls.__name__
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        """The module instance, built on first use."""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self.cls(**self.params)
+        return self._instance
+
+    def spec(self) -> Dict[str, Any]:
+        """Same shape as pipeline_store.module_spec(); defaults filled in from the signature."""
+        params = {}
+        for name, p in inspect.signature(self.cls.__init__).parameters.items():
+            if name != "self" and p.default is not inspect.Parameter.empty:
+                params[name] = p.default
+        params.update(self.params)
+        return {"module": self.cls.__module__, "class": self.cls.__qualname__, "params": params}
+
+    def __repr__(self) -> str:
+        args = ", ".join(f"{k}={v!r}" for k, v in self.params.items())
+        return f"{self.cls_name}({args})"
+
+
+_QE_PKG = "modules.query_expansion"
+_QE_DIR = pathlib.Path(__file__).parent / "modules" / "query_expansion"
+# expander file → (mtime, factories found in it)
+_QE_FILES: Dict[str, Tuple[float, List[ModuleFactory]]] = {}
+
+
+def _discover_query_expanders() -> List[ModuleFactory]:
+    """
+    Scan modules/query_expansion for QueryExpander subclasses.  Files seen
+    before with the same mtime reuse their factories (and cached instances);
+    new files are imported, modified ones reloaded, deleted ones dropped.
+    """
+    seen = set()
+    for _, module_name, _ in pkgutil.iter_modules([str(_QE_DIR)]):
+        path = _QE_DIR / f"{module_name}.py"
+        if not path.exists():
+            continue
+        seen.add(module_name)
+        mtime = path.stat().st_mtime
+        if module_name in _QE_FILES and _QE_FILES[module_name][0] == mtime:
+            continue
+
+        full_name = f"{_QE_PKG}.{module_name}"
+        module = importlib.import_module(full_name)
+        if module_name in _QE_FILES:
+            # edited since the last scan
+            module = importlib.reload(module)
+        factories = [
+            ModuleFactory("query_expansion", obj)
+            for obj in vars(module).values()
             if (
                 isinstance(obj, type)
                 and issubclass(obj, QueryExpander)
                 and obj is not QueryExpander
-            ):
-                expanders.append(obj())
-    return expanders
+                and obj.__module__ == module.__name__
+            )
+        ]
+        _QE_FILES[module_name] = (mtime, factories)
+
+    for module_name in set(_QE_FILES) - seen:
+        del _QE_FILES[module_name]
+    return [f for name in sorted(_QE_FILES) for f in _QE_FILES[name][1]]
+
 
-def reload_search_space():
+def reload_search_space() -> Dict[str, List[ModuleFactory]]:
     """
-    Re-import the whole search_space module so that
-    any newly‐dropped files get picked up.
+    Rescan modules/query_expansion so newly-dropped files get picked up.
+    SEARCH_SPACE is updated in place and returned.
     """
-    import search_space as _ss
-    importlib.reload(_ss)
-    return _ss.SEARCH_SPACE
+    SEARCH_SPACE["query_expansion"] = _discover_query_expanders()
+    return SEARCH_SPACE
 
 
-SEARCH_SPACE = {
+SEARCH_SPACE: Dict[str, List[ModuleFactory]] = {
     "query_expansion": _discover_query_expanders(),
-    "retrieval":       [BM25Retriever(), HybridDBSFRetriever()],
-    "augmentation":    [NoAugment(), PrevNextAugment()],
-    "reranker":        [PassReranker(), FlagLLMReranker()],
-    "prompt_maker":    [FStringPrompt(), LongContextPrompt(), DynamicPrompt()],
-    "generator":       [GPTGenerator()],
-}
\ No newline at end of file
+    "retrieval":       [ModuleFactory("retrieval", BM25Retriever),
+                        ModuleFactory("retrieval", HybridDBSFRetriever),
+                        # HNSW query-time recall/latency trade-off (dense_search raises
+                        # ef_search to at least the 100 pulled, so the default is already 100)
+                        ModuleFactory("retrieval", HybridDBSFRetriever, ef_search=200),
+                        ModuleFactory("retrieval", HybridDBSFRetriever, ef_search=400)],
+    "augmentation":    [ModuleFactory("augmentation", NoAugment),
+                        ModuleFactory("augmentation", PrevNextAugment),
+                        ModuleFactory("augmentation", PageAugment)],
+    "reranker":        [ModuleFactory("reranker", PassReranker),
+                        ModuleFactory("reranker", FlagLLMReranker),
+                        ModuleFactory("reranker", FlagLLMReranker, listwise=True),
+                        ModuleFactory("reranker", EmbeddingSimReranker),
+                        ModuleFactory("reranker", EmbeddingSimReranker, bm25_weight=0.3)],
+    "prompt_maker":    [ModuleFactory("prompt_maker", FStringPrompt),
+                        ModuleFactory("prompt_maker", LongContextPrompt),
+                        ModuleFactory("prompt_maker", DynamicPrompt)],
+    "generator":       [ModuleFactory("generator", GPTGenerator)],
+}
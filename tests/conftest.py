@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# config.Settings requires these; tests never reach the real services
+for var in ("OPENAI_API_KEY", "OPENAI_ENDPOINT", "PGVECTOR_URL",
+            "AZURE_SEARCH_ENDPOINT", "AZURE_SEARCH_KEY"):
+    os.environ.setdefault(var, "test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
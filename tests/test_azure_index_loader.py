@@ -0,0 +1,81 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("azure.search.documents")
+import azure_index_loader
+from azure_index_loader import AzureIndexLoader, key_ranges
+
+_CLAUSE = re.compile(r"(\w+) (gt|ge|lt) '((?:[^']|'')*)'")
+_OPS = {"gt": lambda a, b: a > b, "ge": lambda a, b: a >= b, "lt": lambda a, b: a < b}
+
+
+class FakeSearchClient:
+    """SearchClient.search() over an in-memory index, honouring the filters the loader sends."""
+
+    def __init__(self, docs, fields=("id", "content", "page")):
+        self.docs = sorted(docs, key=lambda d: d["id"])
+        self.fields = set(fields)
+        self.calls = []
+
+    def search(self, search_text, filter, order_by, select, top):
+        self.calls.append({"filter": filter, "select": select, "top": top})
+        assert order_by == ["id asc"]
+        unknown = set(select or ()) - self.fields
+        if unknown:
+            raise ValueError(f"Could not find a property named {sorted(unknown)}")
+        hits = self.docs
+        for key, op, value in _CLAUSE.findall(filter or ""):
+            hits = [d for d in hits if _OPS[op](d[key], value.replace("''", "'"))]
+        hits = hits[:top]
+        return [{k: v for k, v in d.items() if select is None or k in select} for d in hits]
+
+
+def _docs(n, with_page=True):
+    return [{"id": f"{i:05x}", "content": f"chunk {i}", **({"page": i % 7} if with_page else {})}
+            for i in range(n)]
+
+
+def test_keyset_pagination_past_1000_docs():
+    client = FakeSearchClient(_docs(2500))
+    chunks = AzureIndexLoader("ix", client=client, page_size=1000).load_chunks()
+
+    assert [c.metadata["id"] for c in chunks] == [d["id"] for d in client.docs]
+    assert len(client.calls) == 3
+    assert client.calls[0]["filter"] is None
+    assert client.calls[1]["filter"] == "id gt '003e7'"
+
+
+def test_partitions_cover_every_doc_once():
+    client = FakeSearchClient(_docs(2500))
+    loader = AzureIndexLoader("ix", client=client, page_size=300,
+                              partitions=key_ranges(["00400", "00800"]), max_workers=3)
+    ids = [c.metadata["id"] for c in loader.iter_chunks()]
+
+    assert sorted(ids) == [d["id"] for d in client.docs]
+
+
+def test_key_ranges():
+    assert key_ranges([]) == [(None, None)]
+    assert key_ranges(["8", "4"]) == [(None, "4"), ("4", "8"), ("8", None)]
+
+
+@pytest.mark.parametrize("with_page", [True, False])
+def test_default_fields_follow_index_schema(monkeypatch, with_page):
+    names = ["id", "content", "page"] if with_page else ["id", "content"]
+    client = FakeSearchClient(_docs(5, with_page), fields=names)
+
+    class FakeIndexClient:
+        def __init__(self, endpoint, credential):
+            pass
+
+        def get_index(self, name):
+            return SimpleNamespace(fields=[SimpleNamespace(name=n) for n in names])
+
+    monkeypatch.setattr(azure_index_loader, "SearchIndexClient", FakeIndexClient)
+    monkeypatch.setattr(azure_index_loader, "SearchClient", lambda **kwargs: client)
+    chunks = AzureIndexLoader("ix").load_chunks()
+
+    assert client.calls[0]["select"] == names
+    assert [c.metadata["page"] for c in chunks] == [d.get("page", 0) for d in client.docs]
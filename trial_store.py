@@ -0,0 +1,76 @@
+# trial_store.py
+"""
+Checkpoint of optimisation trials.
+
+Every finished trial is stored under a key covering everything its result
+depends on:
+
+  - the spec (import path + constructor params) of the module at every node
+  - the source of every module involved (so an edited module is re-run)
+  - the GT questions evaluated (full set or halving sample)
+  - the collection version and the metric
+  - the environment (pipeline_store.environment_digest): LLM and embedding
+    models, vector backend and quantisation, stage kwargs, and the
+    executor / evaluation sources
+
+An interrupted run therefore resumes at the first trial it had not
+finished, and a re-run after adding a candidate (e.g. a query expander
+uploaded through app_web.py) only evaluates trials whose inputs changed.
+Results live in a SQLiteCache under settings.CACHE_DIR.
+"""
+import hashlib
+import importlib
+import inspect
+from typing import Any, Dict, List, Optional
+
+from cache import SQLiteCache, hash_key
+from config import settings
+from pipeline_store import environment_digest
+
+_SOURCE_HASHES: Dict[str, str] = {}
+
+
+def source_hash(spec: Dict[str, Any]) -> str:
+    """sha256 of the source file defining the spec's class ("" if unknown)."""
+    module = spec["module"]
+    if module not in _SOURCE_HASHES:
+        try:
+            path = inspect.getsourcefile(importlib.import_module(module))
+            with open(path, "rb") as f:
+                _SOURCE_HASHES[module] = hashlib.sha256(f.read()).hexdigest()
+        except (ImportError, OSError, TypeError):
+            _SOURCE_HASHES[module] = ""
+    return _SOURCE_HASHES[module]
+
+
+class TrialStore:
+    def __init__(self, collection_version: str, metric: str = None, name: str = "trials"):
+        self.collection_version = collection_version
+        self.metric = metric or settings.AUTORAG_METRIC
+        self.environment = environment_digest()
+        self.cache = SQLiteCache(name)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, specs: Dict[str, Dict[str, Any]], gt: List[Dict[str, Any]],
+            kind: str = "per-sample") -> str:
+        """
+        Trial key of the pipeline `specs` (node → module spec) on `gt`.  It does
+        not depend on which node is being searched, so the same pipeline is
+        shared between strategies (greedy, TPE, bandit).
+        """
+        pipeline = {n: {**spec, "source": source_hash(spec)} for n, spec in sorted(specs.items())}
+        questions = [(rec["question"], rec.get("answer")) for rec in gt]
+        return hash_key("trial", pipeline, questions,
+                        self.collection_version, self.metric, self.environment, kind)
+
+    def get(self, key: str) -> Optional[Any]:
+        result = self.cache.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result: Any) -> None:
+        self.cache.set(key, result)
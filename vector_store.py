@@ -0,0 +1,429 @@
+# vector_store.py
+"""
+In-process vector store on NumPy (settings.VECTOR_BACKEND = "numpy").
+
+One directory per collection under settings.NUMPY_STORE_DIR:
+  vectors.f32                 unit-normalised float32 rows, memory-mapped
+  ids / texts / metas         append-only UTF-8 blobs + int64 offset files
+  manifest.json               dim, row count and version; written last
+  ivf_*.npy                   optional IVF coarse quantiser (build_ivf)
+  int8.* / binary.codes       optional quantised copies, held in RAM (codes)
+
+Search is exact cosine top-k: one matmul per block of rows for a whole
+batch of queries, `argpartition` per block, merged across blocks.  With an
+IVF built, `nprobe` lists are scanned instead, plus any rows appended since
+the build.  The row count in the manifest is authoritative, so a crash
+mid-append leaves the store readable; the tail is truncated on next write.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config import settings
+
+_BLOCK_ROWS = 65536
+
+# set bits per byte value, for Hamming distances over packed sign bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):          # NumPy >= 2.0
+        return np.bitwise_count(x)
+    return _POPCOUNT[x.view(np.uint8)].reshape(*x.shape, -1).sum(axis=-1)
+
+
+_CODE_WIDTH: Dict[str, Callable[[int], int]] = {
+    "int8": lambda dim: dim,
+    "binary": lambda dim: (dim + 7) // 8,
+}
+
+
+def _quantize(mode: str, vecs: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """int8: symmetric per-row scale (score ≈ codes·q * scale); binary: sign bits."""
+    if mode == "int8":
+        scale = np.abs(vecs).max(axis=1) / 127 + 1e-12
+        return np.round(vecs / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+    return np.packbits(vecs > 0, axis=1), None
+
+
+class _BlobColumn:
+    """Append-only column of byte strings: `<name>.bin` + `<name>.off` (int64, n + 1)."""
+
+    def __init__(self, root: pathlib.Path, name: str):
+        self.data_path = root / f"{name}.bin"
+        self.off_path = root / f"{name}.off"
+        self._offsets: Optional[np.ndarray] = None
+
+    def offsets(self, count: int) -> np.ndarray:
+        if self._offsets is None or len(self._offsets) != count + 1:
+            if count and self.off_path.exists():
+                self._offsets = np.memmap(self.off_path, dtype=np.int64, mode="r", shape=(count + 1,))
+            else:
+                self._offsets = np.zeros(1, dtype=np.int64)
+        return self._offsets
+
+    def append(self, count: int, values: List[bytes]) -> None:
+        offsets = self.offsets(count)
+        end = int(offsets[count])
+        self._offsets = None
+        with open(self.data_path, "ab") as f:
+            f.truncate(end)
+            for v in values:
+                f.write(v)
+        new = end + np.cumsum([len(v) for v in values], dtype=np.int64)
+        with open(self.off_path, "ab") as f:
+            if count == 0:
+                f.truncate(0)
+                f.write(np.zeros(1, dtype=np.int64).tobytes())
+            else:
+                f.truncate((count + 1) * 8)
+            f.write(new.tobytes())
+
+    def get(self, count: int, i: int) -> bytes:
+        offsets = self.offsets(count)
+        with open(self.data_path, "rb") as f:
+            f.seek(int(offsets[i]))
+            return f.read(int(offsets[i + 1] - offsets[i]))
+
+    def get_many(self, count: int, rows: Iterable[int]) -> List[bytes]:
+        if not count:
+            return []
+        offsets = self.offsets(count)
+        out = []
+        with open(self.data_path, "rb") as f:
+            for i in rows:
+                f.seek(int(offsets[i]))
+                out.append(f.read(int(offsets[i + 1] - offsets[i])))
+        return out
+
+
+class NumpyVectorStore:
+    def __init__(self, collection: str = None, root: Optional[pathlib.Path] = None):
+        collection = collection or settings.COLLECTION
+        self.root = pathlib.Path(root or pathlib.Path(settings.NUMPY_STORE_DIR) / collection)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ids = _BlobColumn(self.root, "ids")
+        self.texts = _BlobColumn(self.root, "texts")
+        self.metas = _BlobColumn(self.root, "metas")
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._row_of: Optional[Dict[str, int]] = None
+        self._ivf: Optional[Dict[str, np.ndarray]] = None
+        self._codes: Dict[str, Tuple[np.ndarray, Optional[np.ndarray]]] = {}
+        self._manifest: Dict[str, Any] = {"dim": None, "count": 0, "version": "0-", "ivf_count": 0}
+        if (self.root / "manifest.json").exists():
+            self._manifest = json.loads((self.root / "manifest.json").read_text())
+
+    # ───────────────────────── state ──────────────────────────
+    @property
+    def count(self) -> int:
+        return int(self._manifest["count"])
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._manifest["dim"]
+
+    @property
+    def version(self) -> str:
+        return self._manifest["version"]
+
+    @property
+    def ivf_count(self) -> int:
+        """Rows covered by the IVF; later rows are scanned exactly."""
+        return int(self._manifest.get("ivf_count", 0))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _write_manifest(self) -> None:
+        tmp = self.root / "manifest.json.tmp"
+        tmp.write_text(json.dumps(self._manifest))
+        os.replace(tmp, self.root / "manifest.json")
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) != self.count:
+            if self.count:
+                self._vectors = np.memmap(self.root / "vectors.f32", dtype=np.float32, mode="r",
+                                          shape=(self.count, self.dim))
+            else:
+                self._vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._vectors
+
+    @property
+    def row_of(self) -> Dict[str, int]:
+        if self._row_of is None:
+            self._row_of = {b.decode("utf-8"): i
+                            for i, b in enumerate(self.ids.get_many(self.count, range(self.count)))}
+        return self._row_of
+
+    # ───────────────────────── writes ──────────────────────────
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+            vectors: Any) -> int:
+        """Append rows, skipping ids already stored.  Returns the number added."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            keep = []
+            seen: Set[str] = set()
+            for j, i in enumerate(ids):
+                if i not in self.row_of and i not in seen:
+                    seen.add(i)
+                    keep.append(j)
+            if not keep:
+                return 0
+            vectors = vectors[keep]
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+            if self.dim is None:
+                self._manifest["dim"] = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dim {vectors.shape[1]} does not match store dim {self.dim}")
+
+            count = self.count
+            with open(self.root / "vectors.f32", "ab") as f:
+                f.truncate(count * self.dim * 4)
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            new_ids = [ids[j] for j in keep]
+            self.ids.append(count, [i.encode("utf-8") for i in new_ids])
+            self.texts.append(count, [texts[j].encode("utf-8") for j in keep])
+            self.metas.append(count, [json.dumps(metadatas[j]).encode("utf-8") for j in keep])
+
+            digest = hashlib.md5((self.version + "\x00" + "\x00".join(new_ids)).encode("utf-8")).hexdigest()
+            self._manifest["count"] = count + len(keep)
+            self._manifest["version"] = f"{self.count}-{digest}"
+            self._write_manifest()
+            for r, i in enumerate(new_ids, start=count):
+                self.row_of[i] = r
+            self._vectors = None
+            return len(keep)
+
+    # ───────────────────────── reads ──────────────────────────
+    def existing_ids(self, ids: Iterable[str]) -> Set[str]:
+        return {i for i in ids if i in self.row_of}
+
+    def row(self, r: int) -> Tuple[str, str, Dict[str, Any]]:
+        count = self.count
+        return (self.ids.get(count, r).decode("utf-8"),
+                self.texts.get(count, r).decode("utf-8"),
+                json.loads(self.metas.get(count, r)))
+
+    def scan(self, batch_size: int = 5000) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Every row as (id, text, metadata), ordered like db.scan_collection."""
+        count = self.count
+        metas = [json.loads(m) for m in self.metas.get_many(count, range(count))]
+
+        def order_key(r: int):
+            md = metas[r]
+            return (str(md.get("source", "")), int(md.get("chunk_index", 1 << 62)),
+                    int(md.get("page") if md.get("page") is not None else 1 << 62), r)
+
+        order = sorted(range(count), key=order_key)
+        for start in range(0, count, batch_size):
+            rows = order[start:start + batch_size]
+            for r, i, t in zip(rows, self.ids.get_many(count, rows), self.texts.get_many(count, rows)):
+                yield i.decode("utf-8"), t.decode("utf-8"), metas[r]
+
+    def get_vectors(self, ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        rows = {i: self.row_of[i] for i in ids if i in self.row_of}
+        return {i: np.array(self.vectors[r]) for i, r in rows.items()}
+
+    # ───────────────────────── search ──────────────────────────
+    @staticmethod
+    def _topk(scores: np.ndarray, k: int) -> np.ndarray:
+        """Column indices of the k largest scores per row, best first."""
+        if scores.shape[1] > k:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+        order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+        return np.take_along_axis(part, order, axis=1)
+
+    def _scan(self, q: np.ndarray, k: int, rows: Optional[np.ndarray],
+              score_block: Callable[[np.ndarray, np.ndarray], np.ndarray],
+              block_rows: int = _BLOCK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (rows, scores) per query over `rows` (default: all), block by block."""
+        n = self.count if rows is None else len(rows)
+        best_rows = np.empty((len(q), 0), dtype=np.int64)
+        best_scores = np.empty((len(q), 0), dtype=np.float32)
+        for start in range(0, n, block_rows):
+            if rows is None:
+                block = np.arange(start, min(start + block_rows, n))
+            else:
+                block = np.sort(rows[start:start + block_rows])
+            scores = score_block(q, block)
+            top = self._topk(scores, k)
+            best_rows = np.hstack([best_rows, block[top]])
+            best_scores = np.hstack([best_scores, np.take_along_axis(scores, top, axis=1)])
+            top = self._topk(best_scores, k)
+            best_rows = np.take_along_axis(best_rows, top, axis=1)
+            best_scores = np.take_along_axis(best_scores, top, axis=1)
+        return best_rows, best_scores
+
+    def _exact(self, q: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Full-precision top-k; contiguous blocks are read as slices of the memmap."""
+        def score_block(q: np.ndarray, block: np.ndarray) -> np.ndarray:
+            mat = self.vectors[block[0]:block[-1] + 1] if rows is None else self.vectors[block]
+            return q @ np.asarray(mat).T
+        return self._scan(q, k, rows, score_block)
+
+    def _approx(self, q: np.ndarray, k: int, mode: str) -> Tuple[np.ndarray, np.ndarray]:
+        """First-pass top-k over the quantised codes only."""
+        codes, scales = self.codes(mode)
+        if mode == "int8":
+            def score_block(q: np.ndarray, block: np.ndarray) -> np.ndarray:
+                sl = slice(block[0], block[-1] + 1)
+                return (q @ codes[sl].astype(np.float32).T) * scales[sl]
+            # small blocks: each is widened to float32 for the matmul
+            return self._scan(q, k, None, score_block, block_rows=4096)
+        else:
+            qbits = np.packbits(q > 0, axis=1)
+            if codes.shape[1] % 8 == 0:
+                # XOR / popcount 64 bits at a time
+                codes, qbits = codes.view(np.uint64), qbits.view(np.uint64)
+
+            def score_block(q: np.ndarray, block: np.ndarray) -> np.ndarray:
+                sl = slice(block[0], block[-1] + 1)
+                # negative Hamming distance, so larger is better
+                return -np.stack([_popcount(codes[sl] ^ bits).sum(axis=1, dtype=np.int32)
+                                  for bits in qbits]).astype(np.float32)
+        return self._scan(q, k, None, score_block)
+
+    def search(self,
+               queries: Any,
+               k: int = 10,
+               nprobe: Optional[int] = None,
+               quantization: Optional[str] = None,
+               rescore: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Cosine top-k for a batch of query vectors: one list of (row, score)
+        per query.  `nprobe` uses the IVF (if built).  Otherwise the whole
+        store is scanned: exactly, or with `quantization` ("int8" / "binary",
+        default settings.VECTOR_QUANTIZATION) for a first pass of
+        k * `rescore` candidates that are rescored with the float32 vectors.
+        """
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        q = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-12)
+        if not self.count:
+            return [[] for _ in q]
+        ivf = self.ivf if nprobe else None
+        if ivf is None:
+            mode = quantization or settings.VECTOR_QUANTIZATION
+            if mode == "none":
+                rows, scores = self._exact(q, k)
+                return [list(zip(r.tolist(), s.tolist())) for r, s in zip(rows, scores)]
+            cand, _ = self._approx(q, k * (rescore or settings.VECTOR_RESCORE_FACTOR), mode)
+            out = []
+            for qi in range(len(q)):
+                rows, scores = self._exact(q[qi:qi + 1], k, rows=cand[qi])
+                out.append(list(zip(rows[0].tolist(), scores[0].tolist())))
+            return out
+
+        probes = self._topk(q @ ivf["centroids"].T, min(nprobe, len(ivf["centroids"])))
+        tail = np.arange(self.ivf_count, self.count)
+        out = []
+        for qi, lists in enumerate(probes):
+            cand = np.concatenate([ivf["order"][ivf["offsets"][c]:ivf["offsets"][c + 1]] for c in lists] + [tail])
+            if not len(cand):
+                out.append([])
+                continue
+            rows, scores = self._exact(q[qi:qi + 1], k, rows=cand)
+            out.append(list(zip(rows[0].tolist(), scores[0].tolist())))
+        return out
+
+    # ───────────────────────── quantised codes ──────────────────────────
+    def codes(self, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        In-memory quantised copy of every row: int8 codes + per-row scale,
+        or sign bits packed 8 per byte.  Kept on disk next to the vectors and
+        extended from the float32 rows when the store has grown.
+        """
+        if mode not in _CODE_WIDTH:
+            raise ValueError(f"Unknown quantization: {mode!r}")
+        with self._lock:
+            cached = self._codes.get(mode)
+            if cached is not None and len(cached[0]) == self.count:
+                return cached
+            width = _CODE_WIDTH[mode](self.dim)
+            path = self.root / f"{mode}.codes"
+            # binary codes have no scales
+            scale_path = self.root / f"{mode}.scales" if mode == "int8" else None
+            have = min(path.stat().st_size // width if path.exists() else 0, self.count)
+            if scale_path is not None:
+                have = min(have, scale_path.stat().st_size // 4 if scale_path.exists() else 0)
+            with open(path, "ab") as f, (open(scale_path, "ab") if scale_path else nullcontext()) as g:
+                f.truncate(have * width)
+                if g is not None:
+                    g.truncate(have * 4)
+                for start in range(have, self.count, _BLOCK_ROWS):
+                    code, scale = _quantize(mode, np.asarray(self.vectors[start:start + _BLOCK_ROWS]))
+                    f.write(code.tobytes())
+                    if g is not None:
+                        g.write(scale.tobytes())
+            if mode == "int8":
+                codes = np.fromfile(path, dtype=np.int8).reshape(self.count, width)
+                scales = np.fromfile(scale_path, dtype=np.float32)
+            else:
+                codes, scales = np.fromfile(path, dtype=np.uint8).reshape(self.count, width), None
+            self._codes[mode] = (codes, scales)
+            return codes, scales
+
+    def memory_bytes(self, mode: str = "none") -> int:
+        """Bytes a full scan has to touch: the float32 matrix or the quantised copy."""
+        if mode == "none":
+            return self.count * (self.dim or 0) * 4
+        return self.count * (_CODE_WIDTH[mode](self.dim) + (4 if mode == "int8" else 0))
+
+    # ───────────────────────── IVF ──────────────────────────
+    @property
+    def ivf(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._ivf is None and self.ivf_count and (self.root / "ivf_centroids.npy").exists():
+            self._ivf = {name: np.load(self.root / f"ivf_{name}.npy", mmap_mode="r")
+                         for name in ("centroids", "order", "offsets")}
+        return self._ivf
+
+    def build_ivf(self, n_lists: int = None, iters: int = 10, sample: int = 100_000, seed: int = 0) -> None:
+        """Spherical k-means coarse quantiser over the current rows."""
+        n_lists = min(n_lists or settings.NUMPY_IVF_LISTS, self.count)
+        if n_lists < 1:
+            return
+        rng = np.random.default_rng(seed)
+        vecs = self.vectors
+        train = np.asarray(vecs[np.sort(rng.choice(self.count, min(sample, self.count), replace=False))])
+        centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = train[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+
+        assign = np.concatenate([np.argmax(np.asarray(vecs[s:s + _BLOCK_ROWS]) @ centroids.T, axis=1)
+                                 for s in range(0, self.count, _BLOCK_ROWS)])
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[order], np.arange(n_lists + 1)).astype(np.int64)
+        with self._lock:
+            for name, arr in (("centroids", centroids), ("order", order), ("offsets", offsets)):
+                np.save(self.root / f"ivf_{name}.npy", arr)
+            self._manifest["ivf_count"] = self.count
+            self._write_manifest()
+            self._ivf = None
+
+
+_STORES: Dict[str, NumpyVectorStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(collection: str = None) -> NumpyVectorStore:
+    """Process-wide store per collection, so writers and readers share state."""
+    collection = collection or settings.COLLECTION
+    with _STORES_LOCK:
+        if collection not in _STORES:
+            _STORES[collection] = NumpyVectorStore(collection)
+        return _STORES[collection]